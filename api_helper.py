@@ -1,43 +1,242 @@
 import os
+import re
+import threading
+import time
+from collections import OrderedDict
 import requests
 from dotenv import load_dotenv
 from requests.exceptions import HTTPError, ConnectionError, Timeout
+from quota import QuotaExceeded
 
-# Load environment variables from a .env file
-load_dotenv()
+OMDB_API_URL = "http://www.omdbapi.com/"
 
-# Get the API key from environment variables
-API_KEY = os.getenv("API_KEY")
+# Headers sent with every OMDb request
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+                  '(KHTML, like Gecko) Chrome/85.0.4183.121 Safari/537.36',
+    'Accept-Language': 'en-US,en;q=0.5'
+}
 
+# (pid, session, api key) of this process's OMDb client, created on first use
+_client = None
+_client_lock = threading.Lock()
 
-def fetch_movie_data(title):
+# Shared OMDb quota, set by configure_quota; None means unlimited
+_governor = None
+
+# How long fetched movie data is reused before OMDb is asked again
+CACHE_TTL = 24 * 60 * 60
+CACHE_MAX_ENTRIES = 1024
+
+# imdbID -> (expires_at, movie_data), kept in least-recently-used order
+_movie_cache = OrderedDict()
+# (normalized title, year) -> imdbID, so title searches can reuse the ID cache
+_title_index = OrderedDict()
+_cache_lock = threading.Lock()
+
+# Lookup key -> the OMDb request currently in flight for it
+_in_flight = {}
+_in_flight_lock = threading.Lock()
+
+
+class _Call:
+    """An OMDb request in flight, whose result is shared with every caller waiting for it."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def configure_quota(governor):
+    """
+    Make every OMDb request take a token from a shared quota first.
+    Args:
+        governor (QuotaGovernor): The quota governor, or None to remove the limit.
     """
-    Fetch movie data from the OMDb API based on the provided movie title.
+    global _governor
+    _governor = governor
 
-    This function sends a GET request to the OMDb API with the provided movie title.
-    If the request is successful, it processes the response and extracts relevant
-    movie data such as title, release year, director, IMDb rating, and poster.
 
+def _get_client():
+    """
+    Return this process's HTTP session and OMDb API key, creating them on first use.
+
+    The session keeps connections to OMDb alive between lookups. A forked worker
+    gets its own session instead of sharing the parent's sockets.
+    Returns:
+        tuple: The requests session and the API key.
+    """
+    global _client
+    with _client_lock:
+        if _client is None or _client[0] != os.getpid():
+            # Load environment variables from a .env file
+            load_dotenv()
+            session = requests.Session()
+            session.headers.update(HEADERS)
+            _client = (os.getpid(), session, os.getenv("API_KEY"))
+        return _client[1], _client[2]
+
+
+def _normalize_title(title):
+    """Normalize a title for cache lookups: case-folded with collapsed whitespace."""
+    return " ".join(title.split()).casefold()
+
+
+def _parse_year(value):
+    """
+    Extract the release year from an OMDb 'Year' value.
+
+    Series have ranges such as '2010–2013' or '2019–'; the first year is used.
     Args:
-        title (str): The title of the movie to fetch data for.
+        value (str): The OMDb 'Year' field.
+    Returns:
+        int: The first year, or None if the value has none.
+    """
+    match = re.match(r"\s*(\d{4})", value or "")
+    return int(match.group(1)) if match else None
+
 
+def _parse_rating(value):
+    """
+    Convert an OMDb rating string to a float.
+    Args:
+        value (str): The rating as returned by OMDb, e.g. '8.8' or 'N/A'.
     Returns:
-        dict: A dictionary containing movie details like 'title', 'release_year',
-              'director', 'rating', and 'poster'. Returns None if there is an error
-              in the request or data parsing.
+        float: The rating, or None if OMDb has no rating.
     """
-    # Construct the API URL with the movie title and API key
-    api_url = f"http://www.omdbapi.com/?apikey={API_KEY}&t={title}"
-
-    # Define headers for the API request
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
-                      '(KHTML, like Gecko) Chrome/85.0.4183.121 Safari/537.36',
-        'Accept-Language': 'en-US,en;q=0.5'
-    }
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _cache_get(imdb_id=None, title=None, year=None):
+    """Return cached movie data by imdbID or by a previously searched title, if fresh."""
+    with _cache_lock:
+        if imdb_id is None and title:
+            imdb_id = _title_index.get((_normalize_title(title), year))
+        entry = _movie_cache.get(imdb_id)
+        if not entry:
+            return None
+        expires_at, movie_data = entry
+        if expires_at < time.monotonic():
+            del _movie_cache[imdb_id]
+            return None
+        _movie_cache.move_to_end(imdb_id)
+        return dict(movie_data)
+
+
+def _cache_put(movie_data, title=None, year=None):
+    """Store movie data under its imdbID and remember which title search produced it."""
+    imdb_id = movie_data['imdb_id']
+    if not imdb_id:
+        return
+    with _cache_lock:
+        _movie_cache[imdb_id] = (time.monotonic() + CACHE_TTL, dict(movie_data))
+        _movie_cache.move_to_end(imdb_id)
+        if title is not None:
+            _title_index[(_normalize_title(title), year)] = imdb_id
+            _title_index.move_to_end((_normalize_title(title), year))
+        while len(_movie_cache) > CACHE_MAX_ENTRIES:
+            _movie_cache.popitem(last=False)
+        while len(_title_index) > CACHE_MAX_ENTRIES:
+            _title_index.popitem(last=False)
+
+
+def fetch_movie_data(title=None, imdb_id=None, year=None, use_cache=True):
+    """
+    Fetch movie data from the OMDb API by title or by IMDb ID.
+
+    This function sends a GET request to the OMDb API, looking the movie up by its
+    IMDb ID (`i=`) when one is given and by title (`t=`, optionally narrowed by `y=`)
+    otherwise. If the request is successful, it processes the response and extracts
+    relevant movie data such as IMDb ID, title, release year, director, IMDb rating,
+    and poster. Results are cached in-process under their IMDb ID, and concurrent
+    lookups of the same IMDb ID or normalized title wait for a single request.
+
+    Args:
+        title (str, optional): The title of the movie to fetch data for.
+        imdb_id (str, optional): The IMDb ID of the movie, e.g. 'tt0133093'.
+        year (int, optional): The release year, used to narrow a title search.
+        use_cache (bool, optional): Whether a cached result may be returned.
+                                    Fresh results are always cached.
+
+    Returns:
+        dict: A dictionary containing movie details like 'imdb_id', 'title',
+              'release_year' (int), 'director', 'rating' (float), and 'poster'.
+              A missing year or rating is None. Returns None if there is an
+              error in the request or data parsing.
+
+    Raises:
+        QuotaExceeded: If the OMDb quota is nearly used up and the movie is not cached.
+    """
+    if use_cache:
+        cached = _cache_get(imdb_id=imdb_id, title=title, year=year)
+        if cached:
+            return cached
+
+    # Concurrent lookups of the same movie share one upstream request
+    key = ('i', imdb_id) if imdb_id else ('t', _normalize_title(title or ''), year)
+    with _in_flight_lock:
+        call = _in_flight.get(key)
+        leader = call is None
+        if leader:
+            call = _in_flight[key] = _Call()
+
+    if not leader:
+        call.done.wait()
+        if call.error:
+            raise call.error
+        return dict(call.result) if call.result else None
+
+    try:
+        # The previous leader may have cached the movie after this caller's first check
+        cached = _cache_get(imdb_id=imdb_id, title=title, year=year) if use_cache else None
+        call.result = cached or _request_movie_data(title, imdb_id, year)
+    except BaseException as e:
+        # Waiting callers see the same failure instead of a "not found"
+        call.error = e
+        raise
+    finally:
+        with _in_flight_lock:
+            del _in_flight[key]
+        call.done.set()
+    return dict(call.result) if call.result else None
+
+
+def _request_movie_data(title, imdb_id, year):
+    """
+    Send one lookup to the OMDb API and cache the result.
+    Args:
+        title (str): The title of the movie, used when there is no IMDb ID.
+        imdb_id (str): The IMDb ID of the movie, or None.
+        year (int): The release year, used to narrow a title search, or None.
+    Returns:
+        dict: The movie data as described in fetch_movie_data, or None on error.
+    Raises:
+        QuotaExceeded: If the OMDb quota is nearly used up and the movie is not cached.
+    """
+    if _governor is not None and not _governor.acquire():
+        # Near the limit only cached data is served, even to callers that wanted it fresh
+        cached = _cache_get(imdb_id=imdb_id, title=title, year=year)
+        if cached:
+            return cached
+        raise QuotaExceeded("The OMDb quota is nearly used up. Please try again later.")
+
+    session, api_key = _get_client()
+
+    # Build the query parameters for an ID or a title lookup
+    params = {'apikey': api_key}
+    if imdb_id:
+        params['i'] = imdb_id
+    else:
+        params['t'] = title
+        if year:
+            params['y'] = year
 
     try:
-        response = requests.get(api_url, headers=headers)
+        response = session.get(OMDB_API_URL, params=params)
         response.raise_for_status()  # Raise HTTPError for bad responses (4xx, 5xx)
     except (HTTPError, ConnectionError, Timeout) as req_err:
         print(f"Request error occurred: {req_err}")
@@ -57,11 +256,13 @@ def fetch_movie_data(title):
 
     # Extract relevant movie data
     movie_data = {
+        'imdb_id': data.get('imdbID'),
         'title': data.get('Title', ''),
-        'release_year': data.get('Year', ''),
+        'release_year': _parse_year(data.get('Year')),
         'director': data.get('Director', 'N/A'),
-        'rating': data.get('imdbRating', 'N/A'),
+        'rating': _parse_rating(data.get('imdbRating')),
         'poster': data.get('Poster', 'N/A')
     }
 
+    _cache_put(movie_data, title=None if imdb_id else title, year=year)
     return movie_data
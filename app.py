@@ -1,43 +1,208 @@
 import logging
 import os
+import sqlite3
+import threading
+import time
+from datetime import timedelta
+import json
+import csv
+import click
 import sqlalchemy
 from logging.handlers import RotatingFileHandler
 from sqlalchemy.exc import SQLAlchemyError, NoResultFound
-from flask import Flask, request, render_template, redirect, abort
+from jinja2 import FileSystemBytecodeCache
+from werkzeug.local import LocalProxy
+from flask import (Flask, Blueprint, Response, current_app, request, render_template,
+                   stream_template, stream_with_context, redirect, abort, jsonify)
+from datamanager.data_manager import SORT_FIELDS
 from datamanager.sqlite_data_manager import SQLiteDataManager
+from assets import build_assets, init_assets
+from compression import init_compression
+from profiling import init_profiling
+from refresher import MovieRefresher, backfill_imdb_ids
+import backup
+import transfer
+from quota import QuotaExceeded, QuotaGovernor
+import api_helper
+import server
 
-app = Flask(__name__)
-
-# Configure SQLite URI
 base_dir = os.path.abspath(os.path.dirname(__file__))
-app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{base_dir}/data/movies.sqlite"
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-# Initialize DataManager
-data = SQLiteDataManager(app)
-
-# run once to create tables
-# with app.app_context():
-    # data.db.create_all()
-
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        RotatingFileHandler('app.log', maxBytes=10**6, backupCount=3),
-        logging.StreamHandler()
-    ]
-)
 
-
-@app.route('/', methods=['GET'])
+DEFAULT_CONFIG = {
+    'SQLALCHEMY_DATABASE_URI': f"sqlite:///{base_dir}/data/movies.sqlite",
+    'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+    'REFRESH_CHECKPOINT': os.path.join(base_dir, 'data', 'refresh_checkpoint.json'),
+    'LOG_FILE': 'app.log',
+    # Compiled template cache; defaults to instance/jinja_cache
+    'TEMPLATE_CACHE_DIR': None,
+    # Change log retention, see `flask compact-changes`
+    'CHANGE_LOG_MAX_AGE_DAYS': 7,
+    'CHANGE_LOG_MAX_ROWS': 100000,
+    # Entries read from the database per step while streaming /changes
+    'CHANGES_PAGE_SIZE': 500,
+    # OMDb quota shared by all worker processes; lookups go cache-only below the reserve
+    'QUOTA_DB': os.path.join(base_dir, 'data', 'quota.sqlite'),
+    'OMDB_DAILY_QUOTA': 1000,
+    'OMDB_QUOTA_RESERVE': 50,
+    # Movies one client may add per minute, and in a quick burst
+    'ADD_MOVIE_RATE_PER_MINUTE': 10,
+    'ADD_MOVIE_BURST': 10,
+    # Online backups, see `flask backup-db`
+    'BACKUP_DIR': os.path.join(base_dir, 'data', 'backups'),
+    'BACKUP_KEEP': 7,
+    # Pages copied per step, and seconds writers get between steps
+    'BACKUP_PAGES': 100,
+    'BACKUP_PAUSE': 0.01,
+    # Rows read per query while exporting, and movies linked per transaction while importing
+    'EXPORT_PAGE_SIZE': 500,
+    'IMPORT_BATCH_SIZE': 100,
+}
+
+# Routes and CLI commands; registered on the app by create_app
+main = Blueprint('main', __name__, cli_group=None)
+
+_logging_lock = threading.Lock()
+_logging_configured = False
+
+
+def configure_logging(app):
+    """
+    Set up the log handlers once per process.
+    Args:
+        app (Flask): The Flask application.
+    """
+    global _logging_configured
+    with _logging_lock:
+        if _logging_configured:
+            return
+        logging.basicConfig(
+            level=logging.DEBUG,
+            format='%(asctime)s - %(levelname)s - %(message)s',
+            handlers=[
+                RotatingFileHandler(app.config['LOG_FILE'], maxBytes=10**6, backupCount=3),
+                logging.StreamHandler()
+            ]
+        )
+        _logging_configured = True
+
+
+def get_data_manager():
+    """
+    Return the data manager of the current app.
+
+    The schema is brought up to date on first use, so creating the app does
+    not touch the database.
+    Returns:
+        SQLiteDataManager: The data manager.
+    """
+    manager = current_app.extensions['data_manager']
+    manager.ensure_schema()
+    return manager
+
+
+# The routes use the data manager of whichever app is handling the request
+data = LocalProxy(get_data_manager)
+
+
+def create_app(config=None):
+    """
+    Create and configure the Flask application.
+
+    Nothing expensive happens here: the database is first connected to when a
+    request or command needs it, and the OMDb client is created on the first
+    lookup. Both are recreated in forked worker processes.
+    Args:
+        config (dict, optional): Settings that override DEFAULT_CONFIG.
+    Returns:
+        Flask: The configured application.
+    """
+    app = Flask(__name__)
+    app.config.from_mapping(DEFAULT_CONFIG)
+    # e.g. FLASK_SQLALCHEMY_DATABASE_URI overrides SQLALCHEMY_DATABASE_URI
+    app.config.from_prefixed_env()
+    if config:
+        app.config.from_mapping(config)
+
+    configure_logging(app)
+
+    # Keep compiled templates on disk so restarts and new workers skip compilation
+    cache_dir = app.config.get('TEMPLATE_CACHE_DIR') or os.path.join(app.instance_path, 'jinja_cache')
+    os.makedirs(cache_dir, exist_ok=True)
+    app.jinja_options = {**app.jinja_options, 'bytecode_cache': FileSystemBytecodeCache(cache_dir)}
+
+    # Initialize DataManager; connecting and upgrading the schema wait for first use
+    app.extensions['data_manager'] = SQLiteDataManager(app)
+
+    # Serve fingerprinted, precompressed static files once they have been built
+    init_assets(app)
+
+    # Compress dynamic responses for clients that accept gzip or brotli
+    init_compression(app)
+
+    # Share the OMDb quota between worker processes and limit adds per client
+    governor = QuotaGovernor(app.config['QUOTA_DB'],
+                             daily_quota=app.config['OMDB_DAILY_QUOTA'],
+                             reserve=app.config['OMDB_QUOTA_RESERVE'],
+                             client_rate=app.config['ADD_MOVIE_RATE_PER_MINUTE'],
+                             client_burst=app.config['ADD_MOVIE_BURST'])
+    app.extensions['quota'] = governor
+    api_helper.configure_quota(governor)
+
+    # Profile requests that send the PROFILE_TOKEN header, or a sampled share of them
+    init_profiling(app)
+
+    app.register_blueprint(main)
+    return app
+
+
+# List options of an unsorted, unfiltered movie list
+DEFAULT_LIST_OPTIONS = {
+    'sort': None,
+    'descending': False,
+    'director': None,
+    'min_rating': None,
+    'max_rating': None,
+    'min_year': None,
+    'max_year': None,
+}
+
+
+def get_list_options():
+    """
+    Read the sort and filter options of a movie list from the query string.
+    Unknown sort fields and values that are not numbers are ignored.
+    Returns:
+        dict: Keyword arguments for get_all_movies and get_user_movies,
+              with the same keys as DEFAULT_LIST_OPTIONS.
+    """
+    sort = request.args.get('sort')
+    return {
+        **DEFAULT_LIST_OPTIONS,
+        'sort': sort if sort in SORT_FIELDS else None,
+        'descending': request.args.get('order') == 'desc',
+        'director': request.args.get('director') or None,
+        'min_rating': request.args.get('min_rating', type=float),
+        'max_rating': request.args.get('max_rating', type=float),
+        'min_year': request.args.get('min_year', type=int),
+        'max_year': request.args.get('max_year', type=int),
+    }
+
+
+@main.app_template_global()
+def is_filtered(options):
+    """Tell whether list options narrow a movie list down rather than just reorder it."""
+    return any(options[key] is not None
+               for key in ('director', 'min_rating', 'max_rating', 'min_year', 'max_year'))
+
+
+@main.route('/', methods=['GET'])
 def home():
     """Render the home page of the application."""
     logging.info("Home page accessed")
     return render_template('home.html')
 
 
-@app.route('/users', methods=['GET'])
+@main.route('/users', methods=['GET'])
 def list_users():
     """Display a list of all users registered in the system."""
     try:
@@ -52,24 +217,26 @@ def list_users():
         abort(404)
 
 
-@app.route('/movies', methods=['GET'])
+@main.route('/movies', methods=['GET'])
 def movies():
     """Display a list of all available movies in the system."""
     try:
         logging.info("Accessing the movies list page")
 
-        movies = data.get_all_movies()
+        options = get_list_options()
+        movies = data.get_all_movies(**options)
 
-        # Render the movies template with the retrieved movies
+        # Stream the movies template so the first bytes go out before the last card is rendered
         logging.info("Rendering the movies page with the fetched movies")
-        return render_template('movies.html', movies=movies)
+        return stream_template('movies.html', movies=movies, options=options,
+                               directors=data.get_directors())
 
     except Exception as e:
         logging.error("Error occurred while fetching movies: %s", e)
         abort(404)
 
 
-@app.route('/users/<user_id>', methods=['GET'])
+@main.route('/users/<user_id>', methods=['GET'])
 def user_movies(user_id):
     """Display a list of movies for a specific user, identified by user_id."""
     try:
@@ -85,13 +252,17 @@ def user_movies(user_id):
         logging.info(f"User {user_name} found, fetching their movies.")
 
         # Fetch user movies
-        movies = data.get_user_movies(user_id)
+        options = get_list_options()
+        movies = data.get_user_movies(user_id, **options)
+        directors = data.get_directors()
         if not movies:
             logging.info(f"No movies found for user {user_name}.")
-            return render_template('user_movies.html', user=user_name, movies=None)
+            return render_template('user_movies.html', user=user_name, movies=None,
+                                   options=options, directors=directors)
 
         logging.info(f"Retrieved {len(movies)} movies for user {user_name}.")
-        return render_template('user_movies.html', user=user_name, movies=movies)
+        return stream_template('user_movies.html', user=user_name, movies=movies,
+                               options=options, directors=directors, users=data.get_all_users())
 
     except NoResultFound:
         logging.error(f"User with ID {user_id} not found in database.")
@@ -104,7 +275,7 @@ def user_movies(user_id):
         abort(404)
 
 
-@app.route('/add_user', methods=['GET', 'POST'])
+@main.route('/add_user', methods=['GET', 'POST'])
 def add_user():
     """Add a new user to the system by submitting a form with their name."""
     if request.method == "GET":
@@ -172,7 +343,7 @@ def add_user():
                                success_message=success_message)
 
 
-@app.route('/users/<int:user_id>/add_movie', methods=['GET', 'POST'])
+@main.route('/users/<int:user_id>/add_movie', methods=['GET', 'POST'])
 def add_movie(user_id):
     """Add a new movie to a specific user's collection, identified by user_id."""
     try:
@@ -197,6 +368,12 @@ def add_movie(user_id):
             return render_template('add_movie.html', user=user_name,
                                    warning_message=warning_message)
 
+        if not current_app.extensions['quota'].allow_client(request.remote_addr):
+            logging.warning(f"Client {request.remote_addr} is adding movies too quickly.")
+            warning_message = "You are adding movies too quickly. Please wait a minute."
+            return render_template('add_movie.html', user=user_name,
+                                   warning_message=warning_message), 429
+
         try:
             logging.info(f"Attempting to add movie '{title}' to user {user_name}'s collection.")
 
@@ -221,6 +398,12 @@ def add_movie(user_id):
                 return render_template('add_movie.html', user=user_name,
                                        success_message=success_message)
 
+        except QuotaExceeded as e:
+            # Only cached movies can be added until the quota refills
+            logging.warning(f"OMDb quota exhausted while adding movie '{title}' for user {user_name}.")
+            return render_template('add_movie.html', user=user_name,
+                                   warning_message=str(e)), 503
+
         except sqlalchemy.exc.IntegrityError as e:
             # Log database constraint violation
             logging.error(f"IntegrityError while adding movie '{title}' for user {user_name}: {e}")
@@ -250,13 +433,14 @@ def add_movie(user_id):
                                    warning_message=error_message)
 
 
-@app.route('/users/<user_id>/update_movie/<movie_id>', methods=['GET', 'POST'])
+@main.route('/users/<user_id>/update_movie/<movie_id>', methods=['GET', 'POST'])
 def update_movie(user_id, movie_id):
-    """Update rating of a specific movie for a user."""
+    """Set a user's own rating of a movie in their collection."""
     try:
         # Log movie retrieval attempt
         logging.info(f"Fetching movie with ID {movie_id} for user {user_id}.")
         movie = data.get_movie(movie_id)
+        user_rating = data.get_user_rating(user_id, movie_id)
     except sqlalchemy.exc.NoResultFound:
         logging.error(f"Movie with ID {movie_id} not found for user {user_id}.")
         abort(404)
@@ -268,7 +452,7 @@ def update_movie(user_id, movie_id):
         if not custom_rating:
             logging.warning(f"User {user_id} attempted to update movie {movie_id} without providing a rating.")
             warning_message = "Rating is required."
-            return render_template('update_movie.html', movie=movie,
+            return render_template('update_movie.html', movie=movie, user_rating=user_rating,
                                    warning_message=warning_message, user_id=user_id)
 
         try:
@@ -279,13 +463,13 @@ def update_movie(user_id, movie_id):
             if not (0 <= custom_rating <= 10):
                 logging.warning(f"User {user_id} provided invalid rating {custom_rating} for movie {movie_id}.")
                 warning_message = "Rating must be between 0 and 10."
-                return render_template('update_movie.html', movie=movie,
+                return render_template('update_movie.html', movie=movie, user_rating=user_rating,
                                        warning_message=warning_message, user_id=user_id)
 
         except ValueError:
             logging.warning(f"User {user_id} provided an invalid rating value for movie {movie_id}.")
             warning_message = "Invalid rating. Please enter a valid number between 0 and 10."
-            return render_template('update_movie.html', movie=movie,
+            return render_template('update_movie.html', movie=movie, user_rating=user_rating,
                                    warning_message=warning_message, user_id=user_id)
 
         try:
@@ -297,25 +481,27 @@ def update_movie(user_id, movie_id):
             # Log application-level error
             logging.error(f"ValueError while updating movie {movie_id} for user {user_id}: {ve}")
             error_message = str(ve)
-            return render_template('update_movie.html', movie=movie,
+            return render_template('update_movie.html', movie=movie, user_rating=user_rating,
                                    warning_message=error_message, user_id=user_id)
 
         except Exception as e:
             # Log unexpected errors
             logging.error(f"Unexpected error while updating movie {movie_id} for user {user_id}: {e}")
             error_message = "An error occurred while updating the movie. Please try again."
-            return render_template('update_movie.html', movie=movie,
+            return render_template('update_movie.html', movie=movie, user_rating=user_rating,
                                    warning_message=error_message, user_id=user_id)
 
+        user_rating = custom_rating
         success_message = "Rating updated successfully!"
         logging.info(f"Rating for movie {movie_id} updated successfully for user {user_id}.")
-        return render_template('update_movie.html', movie=movie,
+        return render_template('update_movie.html', movie=movie, user_rating=user_rating,
                                success_message=success_message, user_id=user_id)
 
-    return render_template('update_movie.html', movie=movie, user_id=user_id)
+    return render_template('update_movie.html', movie=movie, user_rating=user_rating,
+                           user_id=user_id)
 
 
-@app.route('/users/<int:user_id>/delete_movie/<int:movie_id>', methods=['GET'])
+@main.route('/users/<int:user_id>/delete_movie/<int:movie_id>', methods=['GET'])
 def delete_movie(user_id, movie_id):
     """Delete a movie from a user's collection."""
     try:
@@ -340,7 +526,204 @@ def delete_movie(user_id, movie_id):
         return redirect(f'/users/{user_id}?message={warning_message}')
 
 
-@app.route('/users/<int:user_id>/update_user', methods=['GET', 'POST'])
+@main.route('/users/<int:user_id>/batch', methods=['POST'])
+def batch_movies(user_id):
+    """Delete, re-rate or move several selected movies of a user's collection at once."""
+    action = request.form.get('action')
+    movie_ids = request.form.getlist('movie_ids', type=int)
+
+    if not movie_ids:
+        logging.warning(f"User {user_id} submitted a batch '{action}' without selecting movies.")
+        return redirect(f'/users/{user_id}?message=Please select at least one movie.')
+
+    try:
+        logging.info(f"Running batch '{action}' on {len(movie_ids)} movies for user {user_id}.")
+
+        if action == 'delete':
+            count = data.delete_movies(user_id, movie_ids)
+            message = f"Deleted {count} movies."
+
+        elif action == 'rate':
+            rating = request.form.get('rating', type=float)
+            if rating is None or not (0 <= rating <= 10):
+                logging.warning(f"User {user_id} provided an invalid batch rating.")
+                return redirect(f'/users/{user_id}?message=Rating must be a number between 0 and 10.')
+            count = data.update_movies(user_id, {movie_id: rating for movie_id in movie_ids})
+            message = f"Updated the rating of {count} movies to {rating}."
+
+        elif action == 'move':
+            target_user_id = request.form.get('target_user_id', type=int)
+            if target_user_id is None or target_user_id == user_id:
+                logging.warning(f"User {user_id} provided an invalid target user for a batch move.")
+                return redirect(f'/users/{user_id}?message=Please choose another user to move the movies to.')
+            count = data.move_movies(user_id, target_user_id, movie_ids)
+            message = f"Moved {count} movies."
+
+        else:
+            logging.warning(f"User {user_id} submitted an unknown batch action '{action}'.")
+            return redirect(f'/users/{user_id}?message=Unknown action.')
+
+        logging.info(f"Batch '{action}' for user {user_id} done: {message}")
+        return redirect(f'/users/{user_id}?message={message}')
+
+    except ValueError as e:
+        logging.error(f"ValueError during batch '{action}' for user {user_id}: {e}")
+        return redirect(f'/users/{user_id}?message={e}')
+
+    except Exception as e:
+        logging.error(f"Unexpected error during batch '{action}' for user {user_id}: {e}")
+        return redirect(f'/users/{user_id}?message=An unexpected error occurred. Please try again.')
+
+
+def export_response(rows, fields, fmt, filename):
+    """
+    Stream an export as a file download.
+    Args:
+        rows (iterable[dict]): The rows to export, read lazily.
+        fields (list[str]): The columns to write.
+        fmt (str): 'csv' or 'ndjson'.
+        filename (str): The suggested file name, without extension.
+    Returns:
+        Response: The streamed download.
+    """
+    response = Response(stream_with_context(transfer.export_rows(rows, fields, fmt)),
+                        mimetype=transfer.FORMATS[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}.{fmt}"'
+    return response
+
+
+@main.route('/users/<int:user_id>/export.<any(csv, ndjson):fmt>', methods=['GET'])
+def export_user_movies(user_id, fmt):
+    """Download a user's collection, with their own ratings, as CSV or NDJSON."""
+    try:
+        data.get_user(user_id)
+    except ValueError:
+        logging.error(f"User with ID {user_id} not found for export.")
+        abort(404)
+
+    logging.info(f"Exporting the collection of user {user_id} as {fmt}.")
+    rows = data.iter_collection(user_id, page_size=current_app.config['EXPORT_PAGE_SIZE'])
+    return export_response(rows, transfer.USER_FIELDS, fmt, f"user-{user_id}-movies")
+
+
+@main.route('/movies/export.<any(csv, ndjson):fmt>', methods=['GET'])
+def export_movies(fmt):
+    """Download the whole catalogue, with the users' average ratings, as CSV or NDJSON."""
+    logging.info(f"Exporting the movie catalogue as {fmt}.")
+    rows = data.iter_collection(page_size=current_app.config['EXPORT_PAGE_SIZE'])
+    return export_response(rows, transfer.CATALOGUE_FIELDS, fmt, "movies")
+
+
+@main.route('/users/<int:user_id>/import', methods=['POST'])
+def import_user_movies(user_id):
+    """Add the movies of an uploaded CSV or NDJSON file to a user's collection."""
+    try:
+        data.get_user(user_id)
+    except ValueError:
+        logging.error(f"User with ID {user_id} not found for import.")
+        abort(404)
+
+    upload = request.files.get('file')
+    if not upload or not upload.filename:
+        logging.warning(f"User {user_id} submitted an import without a file.")
+        return redirect(f'/users/{user_id}?message=Please choose a CSV or NDJSON file to import.')
+
+    fmt = transfer.format_for(upload.filename)
+    logging.info(f"Importing '{upload.filename}' as {fmt} into the collection of user {user_id}.")
+
+    def report(stats):
+        logging.info(f"Import for user {user_id}: {stats['rows']} rows read, {stats['added']} added.")
+
+    def allow_lookup():
+        # Each movie looked up on OMDb counts against the client's add-movie limit
+        return current_app.extensions['quota'].allow_client(request.remote_addr)
+
+    try:
+        stats = transfer.import_collection(
+            data, user_id, transfer.parse_rows(upload.stream, fmt),
+            batch_size=current_app.config['IMPORT_BATCH_SIZE'], progress=report,
+            allow_lookup=allow_lookup)
+
+    except QuotaExceeded as e:
+        logging.warning(f"OMDb quota exhausted while importing for user {user_id}.")
+        return redirect(f'/users/{user_id}?message={e} Movies read so far were imported.')
+
+    except (UnicodeDecodeError, csv.Error) as e:
+        logging.error(f"Unreadable import file for user {user_id}: {e}")
+        return redirect(f'/users/{user_id}?message=The file could not be read as {fmt.upper()}.')
+
+    except ValueError as e:
+        logging.error(f"ValueError while importing for user {user_id}: {e}")
+        return redirect(f'/users/{user_id}?message={e}')
+
+    message = (f"Imported {stats['rows']} rows: {stats['added']} movies added, "
+               f"{stats['not_found']} not found, {stats['invalid']} invalid.")
+    if stats['stopped_at']:
+        logging.warning(f"Client {request.remote_addr} hit the add-movie limit while importing.")
+        message += (f" Stopped at line {stats['stopped_at']}: you are adding movies too quickly."
+                    f" Upload the file again in a minute to continue.")
+    return redirect(f'/users/{user_id}?message={message}')
+
+
+@main.route('/changes', methods=['GET'])
+def changes():
+    """
+    Stream the change log as newline-delimited JSON, for downstream caches and replicas.
+
+    Entries after the `since` sequence number are streamed oldest first, up to
+    the newest entry at the time of the request or `limit` entries. A reader
+    stores the last `seq` it applied and passes it as `since` next time. If
+    entries after `since` were already compacted away, 410 Gone tells the reader
+    to resync from the full data and continue from `latest_seq`. If they are
+    compacted while the stream is being read, it ends with a line holding the
+    same `error`, `oldest_seq` and `latest_seq` instead of an entry.
+    """
+    since = request.args.get('since', 0, type=int)
+    limit = request.args.get('limit', type=int)
+    oldest, latest = data.get_change_log_bounds()
+
+    if oldest is not None and since < oldest - 1:
+        logging.warning(f"Change feed requested since {since}, but the oldest entry is {oldest}.")
+        return jsonify(error="Changes since this sequence number were compacted. Resync first.",
+                       oldest_seq=oldest, latest_seq=latest), 410
+
+    logging.info(f"Streaming changes since {since} up to {latest}.")
+    page_size = current_app.config['CHANGES_PAGE_SIZE']
+
+    def generate():
+        position, remaining = since, limit
+        while latest is not None and remaining != 0:
+            size = page_size if remaining is None else min(page_size, remaining)
+            entries = data.get_changes(since=position, until=latest, limit=size)
+            # Checked after the read, so a compaction that cut into this page is always noticed
+            oldest_now, latest_now = data.get_change_log_bounds()
+            if oldest_now is not None and oldest_now > position + 1:
+                logging.warning(f"Change feed fell behind compaction at {position}; ending stream.")
+                yield json.dumps({"error": "Changes after this point were compacted. Resync first.",
+                                  "oldest_seq": oldest_now, "latest_seq": latest_now}) + "\n"
+                break
+            if not entries:
+                break
+            for entry in entries:
+                yield json.dumps(entry.to_dict()) + "\n"
+            position = entries[-1].seq
+            if remaining is not None:
+                remaining -= len(entries)
+            # Release the session between pages so writers are not held up
+            data.db.session.remove()
+
+    response = Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    response.headers['X-Latest-Seq'] = str(latest or since)
+    return response
+
+
+@main.route('/metrics/quota', methods=['GET'])
+def quota_metrics():
+    """Report the remaining OMDb budget and how often lookups and clients were limited."""
+    return jsonify(current_app.extensions['quota'].stats())
+
+
+@main.route('/users/<int:user_id>/update_user', methods=['GET', 'POST'])
 def update_user(user_id):
     """Update a username."""
     if request.method == "GET":
@@ -411,7 +794,7 @@ def update_user(user_id):
                                success_message=success_message, user=user, user_id=user_id)
 
 
-@app.route('/users/<user_id>/delete_user', methods=['GET'])
+@main.route('/users/<user_id>/delete_user', methods=['GET'])
 def delete_user(user_id):
     """Delete a user from the system."""
     try:
@@ -441,11 +824,201 @@ def delete_user(user_id):
         return redirect(f'/users?warning_message={warning_message}')
 
 
-@app.errorhandler(404)
+@main.cli.command('refresh-movies')
+@click.option('--max-age', default=7, show_default=True,
+              help='Refresh movies whose metadata is older than this many days.')
+@click.option('--rate', default=1.0, show_default=True,
+              help='Maximum OMDb requests per second.')
+@click.option('--concurrency', default=4, show_default=True,
+              help='Maximum number of OMDb requests in flight.')
+@click.option('--batch-size', default=50, show_default=True,
+              help='Number of movies updated per transaction.')
+@click.option('--limit', type=int, default=None,
+              help='Stop after processing this many movies.')
+@click.option('--interval', type=int, default=None,
+              help='Repeat every INTERVAL seconds instead of running once.')
+def refresh_movies(max_age, rate, concurrency, batch_size, limit, interval):
+    """Re-fetch stale movie ratings, directors and posters from OMDb."""
+    refresher = MovieRefresher(data.db, current_app.config['REFRESH_CHECKPOINT'],
+                               max_age=timedelta(days=max_age), rate=rate,
+                               concurrency=concurrency, batch_size=batch_size)
+    while True:
+        try:
+            updated = refresher.run_once(limit=limit)
+            click.echo(f"Updated {updated} movies.")
+        except QuotaExceeded as e:
+            # The checkpoint keeps the progress; the next run resumes from it
+            click.echo(f"Paused: {e}")
+        if interval is None:
+            break
+        time.sleep(interval)
+
+
+@main.cli.command('backfill-imdb-ids')
+@click.option('--rate', default=1.0, show_default=True,
+              help='Maximum OMDb requests per second.')
+def backfill_imdb_ids_command(rate):
+    """Store the IMDb ID of movies added before IDs were tracked."""
+    try:
+        updated, unmatched = backfill_imdb_ids(data, rate=rate)
+    except QuotaExceeded as e:
+        raise click.ClickException(f"{e} Movies updated so far are kept; run the command again later.")
+    click.echo(f"Updated {updated} movies, {unmatched} could not be matched.")
+
+
+@main.cli.command('build-assets')
+def build_assets_command():
+    """Fingerprint, precompress and convert the static assets for production."""
+    manifest = build_assets(current_app.static_folder)
+    click.echo(f"Built {len(manifest['assets'])} assets. Restart the app to serve them.")
+
+
+@main.cli.command('compact-changes')
+@click.option('--max-age', type=int, default=None,
+              help='Keep entries younger than this many days. Defaults to CHANGE_LOG_MAX_AGE_DAYS.')
+@click.option('--max-rows', type=int, default=None,
+              help='Keep at most this many entries. Defaults to CHANGE_LOG_MAX_ROWS.')
+@click.option('--interval', type=int, default=None,
+              help='Repeat every INTERVAL seconds instead of running once.')
+def compact_changes(max_age, max_rows, interval):
+    """Delete old change-log entries so the log stays bounded."""
+    config = current_app.config
+    max_age = timedelta(days=max_age if max_age is not None else config['CHANGE_LOG_MAX_AGE_DAYS'])
+    max_rows = max_rows if max_rows is not None else config['CHANGE_LOG_MAX_ROWS']
+    while True:
+        deleted = data.compact_change_log(max_age=max_age, max_rows=max_rows)
+        click.echo(f"Deleted {deleted} change-log entries.")
+        if interval is None:
+            break
+        time.sleep(interval)
+
+
+@main.cli.command('backup-db')
+@click.option('--keep', type=int, default=None,
+              help='Number of snapshots to keep. Defaults to BACKUP_KEEP.')
+@click.option('--interval', type=int, default=None,
+              help='Repeat every INTERVAL seconds instead of running once.')
+def backup_db(keep, interval):
+    """Snapshot the live database without stopping the app, and verify the snapshot."""
+    config = current_app.config
+    source = backup.database_path(config['SQLALCHEMY_DATABASE_URI'])
+    while True:
+        try:
+            path, manifest = backup.create_backup(
+                source, config['BACKUP_DIR'],
+                keep=keep if keep is not None else config['BACKUP_KEEP'],
+                pages=config['BACKUP_PAGES'], pause=config['BACKUP_PAUSE'])
+            rows = ", ".join(f"{table}: {count}" for table, count in manifest['tables'].items())
+            click.echo(f"Backed up to {path} in {manifest['seconds']} s ({rows}).")
+        except (sqlite3.Error, OSError, ValueError) as e:
+            logging.error(f"Backup failed: {e}")
+            if interval is None:
+                raise click.ClickException(f"Backup failed: {e}")
+        if interval is None:
+            break
+        time.sleep(interval)
+
+
+@main.cli.command('verify-backup')
+@click.argument('snapshot', type=click.Path(exists=True, dir_okay=False))
+def verify_backup_command(snapshot):
+    """Check a snapshot's integrity and row counts."""
+    problems = backup.verify_backup(snapshot)
+    if problems:
+        raise click.ClickException(" ".join(problems))
+    click.echo(f"{snapshot} is sound.")
+
+
+@main.cli.command('restore-backup')
+@click.argument('snapshot', type=click.Path(exists=True, dir_okay=False))
+@click.argument('target', type=click.Path(dir_okay=False))
+def restore_backup_command(snapshot, target):
+    """Restore a snapshot into a new database file, e.g. to load-test against real data."""
+    config = current_app.config
+    try:
+        backup.restore_backup(snapshot, target, pages=config['BACKUP_PAGES'],
+                              pause=config['BACKUP_PAUSE'])
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    click.echo(f"Restored to {target}. Use it with FLASK_SQLALCHEMY_DATABASE_URI=sqlite:///"
+               f"{os.path.abspath(target)}")
+
+
+@main.cli.command('export-collection')
+@click.option('--user-id', type=int, default=None,
+              help="Export this user's collection. Defaults to the whole catalogue.")
+@click.option('--format', 'fmt', type=click.Choice(list(transfer.FORMATS)), default='csv',
+              show_default=True, help='Output format.')
+@click.option('--output', type=click.Path(dir_okay=False, writable=True), default='-',
+              show_default=True, help='File to write to.')
+def export_collection(user_id, fmt, output):
+    """Write a user's collection, or the whole catalogue, as CSV or NDJSON."""
+    if user_id is not None:
+        try:
+            data.get_user(user_id)
+        except ValueError:
+            raise click.ClickException(f"No user found with ID {user_id}.")
+    fields = transfer.CATALOGUE_FIELDS if user_id is None else transfer.USER_FIELDS
+    rows = data.iter_collection(user_id, page_size=current_app.config['EXPORT_PAGE_SIZE'])
+    with click.open_file(output, 'w', encoding='utf-8') as handle:
+        for line in transfer.export_rows(rows, fields, fmt):
+            handle.write(line)
+
+
+@main.cli.command('import-collection')
+@click.argument('user_id', type=int)
+@click.argument('file', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(list(transfer.FORMATS)), default=None,
+              help='Input format. Guessed from the file name by default.')
+@click.option('--batch-size', type=int, default=None,
+              help='Movies linked per transaction. Defaults to IMPORT_BATCH_SIZE.')
+def import_collection_command(user_id, file, fmt, batch_size):
+    """Add the movies of a CSV or NDJSON file to a user's collection."""
+    try:
+        data.get_user(user_id)
+    except ValueError:
+        raise click.ClickException(f"No user found with ID {user_id}.")
+
+    def report(stats):
+        click.echo(f"{stats['rows']} rows read, {stats['added']} added, "
+                   f"{stats['local']} from the catalogue, {stats['omdb']} from OMDb.")
+
+    fmt = fmt or transfer.format_for(file)
+    with open(file, 'rb') as handle:
+        try:
+            stats = transfer.import_collection(
+                data, user_id, transfer.parse_rows(handle, fmt),
+                batch_size=batch_size or current_app.config['IMPORT_BATCH_SIZE'], progress=report)
+        except QuotaExceeded as e:
+            raise click.ClickException(f"{e} Movies read so far were imported; "
+                                       f"run the command again later.")
+        except (UnicodeDecodeError, csv.Error, ValueError) as e:
+            raise click.ClickException(f"Import failed: {e}")
+    click.echo(f"Imported {stats['rows']} rows: {stats['added']} movies added, "
+               f"{stats['not_found']} not found, {stats['invalid']} invalid.")
+
+
+@main.cli.command('serve')
+@click.option('--bind', default='0.0.0.0:8000', show_default=True,
+              help='Address and port to listen on.')
+@click.option('--workers', type=int, default=None,
+              help='Number of worker processes. Defaults to 2 x CPU cores + 1.')
+@click.option('--graceful-timeout', default=30, show_default=True,
+              help='Seconds in-flight requests get to finish on shutdown.')
+def serve(bind, workers, graceful_timeout):
+    """Run the production server: preforked workers, warmed up before serving."""
+    try:
+        server.run(current_app._get_current_object(), bind,
+                   workers or server.default_workers(), graceful_timeout=graceful_timeout)
+    except RuntimeError as e:
+        raise click.ClickException(str(e))
+
+
+@main.app_errorhandler(404)
 def handle_404_error(e):
     """Handle 404 errors globally and display the error description."""
     return render_template('404.html'), 404
 
 
 if __name__ == '__main__':
-    app.run(port=5000, host='0.0.0.0', debug=True)
+    create_app().run(port=5000, host='0.0.0.0', debug=True)
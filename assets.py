@@ -0,0 +1,259 @@
+import gzip
+import hashlib
+import io
+import json
+import logging
+import mimetypes
+import os
+import re
+import shutil
+from flask import request, send_from_directory, url_for
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional; gzip is always produced
+    brotli = None
+
+# Build output, relative to the static folder
+DIST_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+
+# Text assets worth precompressing
+COMPRESSIBLE = {'.css', '.js', '.svg', '.json', '.txt', '.html'}
+
+# Raster images that get WebP/AVIF variants, and the variants in order of preference
+IMAGE_FORMATS = {'.png', '.jpg', '.jpeg'}
+VARIANT_FORMATS = [('avif', 'image/avif'), ('webp', 'image/webp')]
+
+# Icons are shipped at 512px but displayed at 24px; keep 2x for high-DPI screens
+RESIZE = {'pen.png': 48, 'bin.png': 48}
+
+# One year, the longest lifetime caches honour
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+CSS_URL = re.compile(r"url\(\s*(['\"]?)([^'\")]+)\1\s*\)")
+
+
+def _fingerprint(name, content):
+    """Return `name` with a short content hash inserted before the extension."""
+    stem, ext = os.path.splitext(name)
+    return f"{stem}.{hashlib.sha256(content).hexdigest()[:10]}{ext}"
+
+
+def _write(out_dir, name, content):
+    """Write `content` under the build directory and return its static-relative path."""
+    path = os.path.join(out_dir, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as handle:
+        handle.write(content)
+    return f"{DIST_DIR}/{name}"
+
+
+def _precompress(out_dir, name, content):
+    """
+    Write gzip and, when available, brotli copies next to a built asset.
+    Args:
+        out_dir (str): The build directory.
+        name (str): The fingerprinted file name.
+        content (bytes): The uncompressed file content.
+    Returns:
+        list[str]: The encodings written, best first.
+    """
+    encodings = []
+    if brotli is not None:
+        compressed = brotli.compress(content, quality=11)
+        if len(compressed) < len(content):
+            _write(out_dir, f"{name}.br", compressed)
+            encodings.append('br')
+    compressed = gzip.compress(content, compresslevel=9, mtime=0)
+    if len(compressed) < len(content):
+        _write(out_dir, f"{name}.gz", compressed)
+        encodings.append('gzip')
+    return encodings
+
+
+def _load_image(filename, content):
+    """
+    Open a raster image with Pillow, downscaling icons listed in RESIZE.
+    Returns:
+        Image: The image, or None if Pillow is missing or cannot read the file.
+    """
+    try:
+        # Imported here so serving the app never pays for loading Pillow
+        from PIL import Image
+    except ImportError:  # Pillow is optional; images are then only fingerprinted
+        return None
+    try:
+        image = Image.open(io.BytesIO(content))
+        image.load()
+    except (OSError, ValueError) as e:
+        logging.warning(f"Skipping image variants for '{filename}': {e}")
+        return None
+
+    size = RESIZE.get(filename)
+    if size and max(image.size) > size:
+        image.thumbnail((size, size), Image.LANCZOS)
+    return image
+
+
+def _encode_image(image, fmt):
+    """Encode a Pillow image in `fmt`, or return None if the codec is unavailable."""
+    from PIL import features
+    if fmt != 'png' and not features.check(fmt):
+        return None
+    buffer = io.BytesIO()
+    if fmt == 'png':
+        image.save(buffer, 'PNG', optimize=True)
+    else:
+        image.save(buffer, fmt.upper(), quality=80)
+    return buffer.getvalue()
+
+
+def build_assets(static_folder):
+    """
+    Build fingerprinted, precompressed copies of the static assets.
+
+    Every file in the static folder is copied into `dist/` under a name that
+    contains a hash of its content, so it can be cached forever. Raster images
+    also get smaller WebP/AVIF variants, stylesheets have their `url()`
+    references rewritten to the fingerprinted names, and text assets are
+    precompressed with gzip and brotli. The result is described by
+    `dist/manifest.json`, which `init_assets` reads at start-up.
+    Args:
+        static_folder (str): The Flask app's static folder.
+    Returns:
+        dict: The manifest that was written.
+    """
+    out_dir = os.path.join(static_folder, DIST_DIR)
+    shutil.rmtree(out_dir, ignore_errors=True)
+
+    sources = []
+    for root, dirs, files in os.walk(static_folder):
+        dirs[:] = [d for d in dirs if os.path.join(root, d) != out_dir]
+        for file in sorted(files):
+            path = os.path.join(root, file)
+            sources.append(os.path.relpath(path, static_folder).replace(os.sep, '/'))
+
+    manifest = {'assets': {}, 'variants': {}, 'encodings': {}}
+
+    # Images and other binary files first, so stylesheets can refer to them
+    stylesheets = [name for name in sources if name.endswith('.css')]
+    for filename in sources:
+        if filename in stylesheets:
+            continue
+        with open(os.path.join(static_folder, filename), 'rb') as handle:
+            content = handle.read()
+        ext = os.path.splitext(filename)[1].lower()
+
+        image = _load_image(filename, content) if ext in IMAGE_FORMATS else None
+        if image is not None and filename in RESIZE and ext == '.png':
+            content = _encode_image(image, 'png')
+
+        built = _write(out_dir, _fingerprint(filename, content), content)
+        manifest['assets'][filename] = built
+
+        if image is not None:
+            stem = os.path.splitext(filename)[0]
+            variants = []
+            for fmt, mimetype in VARIANT_FORMATS:
+                encoded = _encode_image(image, fmt)
+                if encoded and len(encoded) < len(content):
+                    variant = _write(out_dir, _fingerprint(f"{stem}.{fmt}", encoded), encoded)
+                    variants.append([mimetype, variant])
+            if variants:
+                manifest['variants'][filename] = variants
+
+        if ext in COMPRESSIBLE:
+            manifest['encodings'][built] = _precompress(out_dir, built[len(DIST_DIR) + 1:], content)
+
+    for filename in stylesheets:
+        with open(os.path.join(static_folder, filename), encoding='utf-8') as handle:
+            css = handle.read()
+        base = os.path.dirname(filename)
+
+        def rewrite(match):
+            target = os.path.normpath(os.path.join(base, match.group(2))).replace(os.sep, '/')
+            built_target = manifest['assets'].get(target)
+            if not built_target:
+                return match.group(0)
+            # Both files live in dist/, so the reference stays relative
+            return f"url({os.path.relpath(built_target, os.path.dirname(f'{DIST_DIR}/{filename}'))})"
+
+        content = CSS_URL.sub(rewrite, css).encode('utf-8')
+        built = _write(out_dir, _fingerprint(filename, content), content)
+        manifest['assets'][filename] = built
+        manifest['encodings'][built] = _precompress(out_dir, built[len(DIST_DIR) + 1:], content)
+
+    with open(os.path.join(out_dir, MANIFEST_NAME), 'w') as handle:
+        json.dump(manifest, handle, indent=2, sort_keys=True)
+
+    logging.info(f"Built {len(manifest['assets'])} assets into {out_dir}.")
+    return manifest
+
+
+def init_assets(app):
+    """
+    Serve the built assets when a manifest exists.
+
+    `url_for('static', filename=...)` is rewritten to the fingerprinted name,
+    fingerprinted files are served with a one-year immutable Cache-Control and,
+    when the client accepts it, as their precompressed brotli or gzip copy.
+    Without a manifest (e.g. during development) the original files are served
+    as before.
+    Args:
+        app (Flask): The Flask application.
+    """
+    manifest_path = os.path.join(app.static_folder, DIST_DIR, MANIFEST_NAME)
+    try:
+        with open(manifest_path) as handle:
+            manifest = json.load(handle)
+    except FileNotFoundError:
+        manifest = {'assets': {}, 'variants': {}, 'encodings': {}}
+    except (OSError, ValueError) as e:
+        logging.warning(f"Ignoring unreadable asset manifest {manifest_path}: {e}")
+        manifest = {'assets': {}, 'variants': {}, 'encodings': {}}
+
+    assets = manifest['assets']
+    encodings = manifest['encodings']
+    built = set(assets.values())
+    for variants in manifest['variants'].values():
+        built.update(variant for _, variant in variants)
+
+    @app.url_defaults
+    def fingerprint_static_urls(endpoint, values):
+        """Point url_for('static', ...) at the fingerprinted copy of the file."""
+        if endpoint == 'static' and values.get('filename') in assets:
+            values['filename'] = assets[values['filename']]
+
+    @app.template_global()
+    def static_variants(filename):
+        """
+        List the modern-format variants of a static image.
+        Returns:
+            list: (mimetype, url) pairs, best format first, for use in <picture> sources.
+        """
+        return [(mimetype, url_for('static', filename=variant))
+                for mimetype, variant in manifest['variants'].get(filename, [])]
+
+    def serve_static(filename):
+        """Serve a static file, using precompressed copies and immutable caching for built assets."""
+        if filename not in built:
+            return app.send_static_file(filename)
+
+        accepted = request.accept_encodings
+        encoding = next((e for e in encodings.get(filename, []) if accepted[e]), None)
+        suffix = {'br': '.br', 'gzip': '.gz'}.get(encoding, '')
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+        response = send_from_directory(app.static_folder, filename + suffix,
+                                       mimetype=mimetype, max_age=IMMUTABLE_MAX_AGE)
+        if encoding:
+            response.content_encoding = encoding
+        if filename in encodings:
+            response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+
+    if app.has_static_folder:
+        app.view_functions['static'] = serve_static
@@ -0,0 +1,187 @@
+import json
+import logging
+import os
+import sqlite3
+import time
+from datetime import datetime, timezone
+from sqlalchemy.engine import make_url
+
+SNAPSHOT_PREFIX = 'movies-'
+
+
+def database_path(uri):
+    """
+    Return the file path of a SQLite database URI.
+    Args:
+        uri (str): e.g. 'sqlite:////srv/app/data/movies.sqlite'.
+    Returns:
+        str: The database file path.
+    """
+    url = make_url(uri)
+    if url.get_backend_name() != 'sqlite' or not url.database or url.database == ':memory:':
+        raise ValueError(f"Only SQLite database files can be backed up, not '{uri}'.")
+    return url.database
+
+
+def copy_database(source, target, pages=100, pause=0.01):
+    """
+    Copy a live SQLite database with the online backup API.
+
+    The copy is made `pages` pages at a time. Between steps the source is
+    unlocked for `pause` seconds, so the app keeps writing while the copy is
+    made. SQLite restarts the copy if the source changes mid-way, so the
+    result is always a consistent snapshot.
+    Args:
+        source (str): The database file to copy.
+        target (str): The file to write the copy to.
+        pages (int, optional): Pages copied per step.
+        pause (float, optional): Seconds to wait between steps.
+    """
+    def progress(status, remaining, total):
+        if remaining:
+            time.sleep(pause)
+
+    # Opened read-only, so a missing source is an error instead of a new empty database
+    src = sqlite3.connect(f"file:{source}?mode=ro", uri=True)
+    dst = sqlite3.connect(target)
+    try:
+        src.backup(dst, pages=pages, progress=progress)
+    finally:
+        dst.close()
+        src.close()
+
+
+def inspect_database(path):
+    """
+    Check a database file's integrity and count the rows of every table.
+    Args:
+        path (str): The database file.
+    Returns:
+        dict: 'integrity' ('ok' or SQLite's first complaint) and 'tables' (row count by table).
+    """
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        integrity = conn.execute("PRAGMA integrity_check").fetchone()[0]
+        tables = [name for (name,) in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' "
+            "ORDER BY name")]
+        counts = {name: conn.execute(f'SELECT count(*) FROM "{name}"').fetchone()[0]
+                  for name in tables}
+        return {"integrity": integrity, "tables": counts}
+    finally:
+        conn.close()
+
+
+def list_snapshots(backup_dir):
+    """
+    List the snapshots in a backup directory.
+    Args:
+        backup_dir (str): The backup directory.
+    Returns:
+        list[str]: Snapshot paths, oldest first.
+    """
+    if not os.path.isdir(backup_dir):
+        return []
+    return [os.path.join(backup_dir, name) for name in sorted(os.listdir(backup_dir))
+            if name.startswith(SNAPSHOT_PREFIX) and name.endswith('.sqlite')]
+
+
+def create_backup(source, backup_dir, keep=7, pages=100, pause=0.01):
+    """
+    Snapshot the database, verify the snapshot and remove the oldest beyond `keep`.
+
+    The snapshot is written under a temporary name and only renamed once its
+    integrity check passes. A manifest next to it records its row counts, so
+    it can be verified again later.
+    Args:
+        source (str): The database file to back up.
+        backup_dir (str): Where snapshots are kept.
+        keep (int, optional): The number of snapshots to keep.
+        pages (int, optional): Pages copied per step.
+        pause (float, optional): Seconds to wait between steps.
+    Returns:
+        tuple: The snapshot path and its manifest.
+    """
+    os.makedirs(backup_dir, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    path = os.path.join(backup_dir, f"{SNAPSHOT_PREFIX}{stamp}.sqlite")
+    partial = f"{path}.partial"
+
+    started = time.perf_counter()
+    try:
+        copy_database(source, partial, pages=pages, pause=pause)
+        report = inspect_database(partial)
+        if report["integrity"] != 'ok':
+            raise ValueError(f"Backup failed its integrity check: {report['integrity']}")
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+
+    manifest = {
+        "source": os.path.abspath(source),
+        "created_at": stamp,
+        "seconds": round(time.perf_counter() - started, 3),
+        "bytes": os.path.getsize(partial),
+        "tables": report["tables"],
+    }
+    with open(f"{path[:-len('.sqlite')]}.json", 'w') as handle:
+        json.dump(manifest, handle, indent=2)
+    os.replace(partial, path)
+    logging.info(f"Backed up {source} to {path} in {manifest['seconds']} s.")
+
+    for old in list_snapshots(backup_dir)[:-keep] if keep else []:
+        os.remove(old)
+        manifest_path = f"{old[:-len('.sqlite')]}.json"
+        if os.path.exists(manifest_path):
+            os.remove(manifest_path)
+        logging.info(f"Removed old backup {old}.")
+
+    return path, manifest
+
+
+def verify_backup(path):
+    """
+    Check a snapshot's integrity and compare its row counts with its manifest.
+    Snapshots without a manifest only get the integrity check.
+    Args:
+        path (str): The snapshot file.
+    Returns:
+        list[str]: Problems found; empty if the snapshot is sound.
+    """
+    report = inspect_database(path)
+    problems = []
+    if report["integrity"] != 'ok':
+        problems.append(f"Integrity check failed: {report['integrity']}")
+
+    try:
+        with open(f"{path[:-len('.sqlite')]}.json") as handle:
+            expected = json.load(handle)["tables"]
+    except FileNotFoundError:
+        logging.warning(f"No manifest found for {path}, row counts were not compared.")
+        return problems
+
+    for table, count in expected.items():
+        actual = report["tables"].get(table)
+        if actual != count:
+            problems.append(f"Table '{table}' has {actual} rows, expected {count}.")
+    return problems
+
+
+def restore_backup(snapshot, target, pages=100, pause=0.01):
+    """
+    Restore a verified snapshot into a new database file, e.g. for load testing.
+    Args:
+        snapshot (str): The snapshot file.
+        target (str): The database file to create. It must not exist yet.
+        pages (int, optional): Pages copied per step.
+        pause (float, optional): Seconds to wait between steps.
+    """
+    if os.path.exists(target):
+        raise ValueError(f"'{target}' already exists; restore into a fresh database file.")
+    problems = verify_backup(snapshot)
+    if problems:
+        raise ValueError(f"Refusing to restore '{snapshot}': {' '.join(problems)}")
+    os.makedirs(os.path.dirname(os.path.abspath(target)), exist_ok=True)
+    copy_database(snapshot, target, pages=pages, pause=pause)
+    logging.info(f"Restored {snapshot} to {target}.")
@@ -0,0 +1,155 @@
+"""
+Load-test the app and compare the development server with the production server.
+
+With --url, the given running server is measured. With --compare, the script
+starts `flask run` (the single-process development server) and `flask serve`
+(the preforking production server) one after the other on a throwaway copy of
+the database, measures both with the same load and prints the results side by
+side.
+
+Usage:
+    python benchmarks/load_test.py --url http://localhost:8000/movies
+    python benchmarks/load_test.py --compare --path /movies --concurrency 16 --duration 10
+"""
+import argparse
+import os
+import shutil
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import requests
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+
+
+def load_test(url, concurrency, duration):
+    """
+    Send requests from `concurrency` threads for `duration` seconds.
+    Args:
+        url (str): The page to request.
+        concurrency (int): The number of concurrent clients.
+        duration (float): How long to keep sending requests, in seconds.
+    Returns:
+        dict: Request count, errors, throughput and latency percentiles.
+    """
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client():
+        session = requests.Session()
+        local, failed = [], 0
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                response = session.get(url, timeout=30)
+                response.content
+                if response.status_code != 200:
+                    failed += 1
+            except requests.RequestException:
+                failed += 1
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    percentile = lambda p: latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000
+    return {
+        'requests': len(latencies),
+        'errors': errors[0],
+        'rps': len(latencies) / elapsed,
+        'p50': statistics.median(latencies) * 1000 if latencies else 0,
+        'p95': percentile(0.95) if latencies else 0,
+        'p99': percentile(0.99) if latencies else 0,
+    }
+
+
+def wait_until_up(url, timeout=30):
+    """Poll `url` until the server answers or `timeout` seconds have passed."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            requests.get(url, timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError(f"Server at {url} did not start within {timeout} seconds.")
+
+
+def run_server(command, env, url, concurrency, duration):
+    """Start a server process, load-test it and stop it gracefully."""
+    process = subprocess.Popen(command, cwd=ROOT, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                               start_new_session=True)
+    try:
+        wait_until_up(url)
+        return load_test(url, concurrency, duration)
+    finally:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait(timeout=60)
+
+
+def print_results(results):
+    """Print one row per measured server."""
+    print(f"{'server':<12}{'requests':>10}{'errors':>8}{'req/s':>10}"
+          f"{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, result in results.items():
+        print(f"{name:<12}{result['requests']:>10}{result['errors']:>8}{result['rps']:>10.1f}"
+              f"{result['p50']:>10.1f}{result['p95']:>10.1f}{result['p99']:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--url', help='Measure an already running server.')
+    target.add_argument('--compare', action='store_true',
+                        help='Start and measure the development and production servers.')
+    parser.add_argument('--path', default='/movies', help='Page requested with --compare.')
+    parser.add_argument('--concurrency', type=int, default=16, help='Concurrent clients.')
+    parser.add_argument('--duration', type=float, default=10, help='Seconds per measurement.')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Production server workers (default: derived from the CPU count).')
+    args = parser.parse_args()
+
+    if args.url:
+        print_results({'server': load_test(args.url, args.concurrency, args.duration)})
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database = os.path.join(tmp, 'movies.sqlite')
+        shutil.copy(os.path.join(ROOT, 'data', 'movies.sqlite'), database)
+        env = dict(os.environ,
+                   FLASK_APP='app',
+                   FLASK_SQLALCHEMY_DATABASE_URI=f'sqlite:///{database}',
+                   FLASK_LOG_FILE=os.path.join(tmp, 'app.log'))
+        env.pop('FLASK_DEBUG', None)
+
+        serve = [sys.executable, '-m', 'flask', 'serve', '--bind', '127.0.0.1:5101']
+        if args.workers:
+            serve += ['--workers', str(args.workers)]
+
+        results = {
+            'dev': run_server([sys.executable, '-m', 'flask', 'run', '--port', '5100'], env,
+                              f'http://127.0.0.1:5100{args.path}', args.concurrency, args.duration),
+            'production': run_server(serve, env, f'http://127.0.0.1:5101{args.path}',
+                                     args.concurrency, args.duration),
+        }
+    print_results(results)
+
+
+if __name__ == '__main__':
+    main()
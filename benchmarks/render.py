@@ -0,0 +1,87 @@
+"""
+Measure template compilation and rendering.
+
+Reports how long it takes to compile every template from source, how long it
+takes to load them from a warm bytecode cache (what a restarted worker does),
+and the time to render the movie list pages for a collection of a given size.
+
+Usage:
+    python benchmarks/render.py --movies 500 --repeat 20
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+from jinja2 import FileSystemBytecodeCache
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+from app import DEFAULT_LIST_OPTIONS, create_app  # noqa: E402
+
+
+def load_all(env):
+    """Compile or load every template in a fresh environment; return seconds taken."""
+    start = time.perf_counter()
+    for name in env.list_templates():
+        env.get_template(name)
+    return time.perf_counter() - start
+
+
+def median_ms(func, repeat):
+    """Run `func` `repeat` times and return the median duration in milliseconds."""
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+    return statistics.median(durations) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--movies', type=int, default=500, help='Movies in the rendered list.')
+    parser.add_argument('--repeat', type=int, default=20, help='Measurements per step.')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app({'TEMPLATE_CACHE_DIR': os.path.join(tmp, 'app_cache'),
+                          'LOG_FILE': os.path.join(tmp, 'app.log')})
+
+        # A fresh template cache per environment, so every load starts cold in memory
+        def no_cache():
+            return app.jinja_env.overlay(bytecode_cache=None, cache_size=400)
+
+        def warm_cache():
+            return app.jinja_env.overlay(bytecode_cache=bytecode_cache, cache_size=400)
+
+        os.makedirs(os.path.join(tmp, 'bench_cache'))
+        bytecode_cache = FileSystemBytecodeCache(os.path.join(tmp, 'bench_cache'))
+        load_all(warm_cache())
+
+        print(f"{'step':<38}{'median ms':>10}")
+        print(f"{'compile all templates':<38}{median_ms(lambda: load_all(no_cache()), args.repeat):>10.2f}")
+        print(f"{'load from bytecode cache':<38}{median_ms(lambda: load_all(warm_cache()), args.repeat):>10.2f}")
+
+        movies = [SimpleNamespace(id=i, title=f"Movie {i}", release_year=2000 + i % 25,
+                                  rating=round(5 + i % 50 / 10, 1), director=f"Director {i % 40}",
+                                  poster="https://example.com/poster.jpg",
+                                  rating_count=i % 4, average_rating=round(6 + i % 40 / 10, 1),
+                                  user_rating=round(4 + i % 60 / 10, 1) if i % 3 else None)
+                  for i in range(args.movies)]
+        user = SimpleNamespace(id=1, name="Benchmark")
+        # The pages' sort and filter form, unsorted and unfiltered
+        lists = {'options': dict(DEFAULT_LIST_OPTIONS), 'directors': [], 'users': []}
+
+        with app.test_request_context('/'):
+            for name, context in (('movies.html', {'movies': movies, **lists}),
+                                  ('user_movies.html', {'movies': movies, 'user': user, **lists})):
+                template = app.jinja_env.get_template(name)
+                ms = median_ms(lambda: template.render(**context), args.repeat)
+                print(f"{f'render {name} ({args.movies} movies)':<38}{ms:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Measure the cold-start cost of the app.
+
+Each run starts a fresh Python process that imports `app`, calls `create_app()`
+and then serves two requests through the test client, timing every step. The
+first request includes the deferred work (database connection, schema check,
+template compilation); the second shows the warm cost for comparison.
+
+Runs use a throwaway copy of the database, so the real data is never touched.
+The runs share one compiled-template cache, as restarted workers do; pass
+--cold-templates to give every run an empty cache instead.
+
+Usage:
+    python benchmarks/startup.py --runs 10 --path /movies [--cold-templates]
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+
+# Executed in a fresh interpreter for every run
+CHILD = """
+import json, sys, time
+start = time.perf_counter()
+import app as app_module
+imported = time.perf_counter()
+app = app_module.create_app({'SQLALCHEMY_DATABASE_URI': sys.argv[1], 'LOG_FILE': sys.argv[2],
+                             'TEMPLATE_CACHE_DIR': sys.argv[4]})
+created = time.perf_counter()
+client = app.test_client()
+client.get(sys.argv[3]).get_data()
+first = time.perf_counter()
+client.get(sys.argv[3]).get_data()
+second = time.perf_counter()
+print(json.dumps({
+    'import': imported - start,
+    'create_app': created - imported,
+    'first_request': first - created,
+    'second_request': second - first,
+}))
+"""
+
+STEPS = ['import', 'create_app', 'first_request', 'second_request']
+
+
+def run_once(database_uri, log_file, path, template_cache):
+    """Start one fresh process and return its timings in seconds."""
+    result = subprocess.run(
+        [sys.executable, '-c', CHILD, database_uri, log_file, path, template_cache],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10, help='Number of cold starts to measure.')
+    parser.add_argument('--path', default='/movies', help='Page requested after start-up.')
+    parser.add_argument('--cold-templates', action='store_true',
+                        help='Start every run with an empty compiled-template cache.')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database = os.path.join(tmp, 'movies.sqlite')
+        shutil.copy(os.path.join(ROOT, 'data', 'movies.sqlite'), database)
+        database_uri = f"sqlite:///{database}"
+        log_file = os.path.join(tmp, 'app.log')
+
+        template_cache = os.path.join(tmp, 'jinja_cache')
+        if not args.cold_templates:
+            # Fill the shared cache once, outside the measured runs
+            run_once(database_uri, log_file, args.path, template_cache)
+
+        samples = []
+        for run in range(args.runs):
+            if args.cold_templates:
+                template_cache = os.path.join(tmp, f'jinja_cache_{run}')
+            samples.append(run_once(database_uri, log_file, args.path, template_cache))
+
+    print(f"{'step':<16}{'median ms':>12}{'min ms':>10}{'max ms':>10}")
+    for step in STEPS:
+        values = [sample[step] * 1000 for sample in samples]
+        print(f"{step:<16}{statistics.median(values):>12.1f}{min(values):>10.1f}{max(values):>10.1f}")
+    total = [sum(sample[step] for step in STEPS[:3]) * 1000 for sample in samples]
+    print(f"{'cold start':<16}{statistics.median(total):>12.1f}{min(total):>10.1f}{max(total):>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
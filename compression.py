@@ -0,0 +1,124 @@
+import gzip
+import logging
+import zlib
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional; gzip is always available
+    brotli = None
+
+# Dynamic responses worth compressing
+COMPRESSIBLE_MIMETYPES = {
+    'text/html', 'text/plain', 'text/css', 'text/csv', 'text/javascript',
+    'application/json', 'application/javascript', 'application/x-ndjson',
+}
+
+
+def _choose_encoding():
+    """
+    Pick the best content encoding the client accepts.
+    Returns:
+        str: 'br', 'gzip' or None.
+    """
+    offered = ['br', 'gzip'] if brotli is not None else ['gzip']
+    return request.accept_encodings.best_match(offered)
+
+
+def _compress(body, encoding, level, br_quality):
+    """Compress a complete response body."""
+    if encoding == 'br':
+        return brotli.compress(body, quality=br_quality)
+    return gzip.compress(body, compresslevel=level)
+
+
+def _compress_stream(chunks, encoding, level, br_quality, buffer_size):
+    """
+    Compress a streamed response body chunk by chunk.
+
+    Small template fragments are gathered until `buffer_size` bytes are pending,
+    then compressed and flushed, so the client receives data as it is rendered
+    without paying for a flush on every fragment.
+    Args:
+        chunks: The response iterable, yielding bytes.
+        encoding (str): 'br' or 'gzip'.
+        level (int): The gzip compression level.
+        br_quality (int): The brotli quality.
+        buffer_size (int): Bytes to gather before flushing.
+    Yields:
+        bytes: Compressed data.
+    """
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=br_quality)
+        compress, flush, finish = compressor.process, compressor.flush, compressor.finish
+    else:
+        # wbits=31 produces a gzip header and trailer
+        compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+        compress, finish = compressor.compress, compressor.flush
+
+        def flush():
+            return compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    pending, pending_size = [], 0
+    for chunk in chunks:
+        pending.append(chunk)
+        pending_size += len(chunk)
+        if pending_size >= buffer_size:
+            yield compress(b"".join(pending)) + flush()
+            pending, pending_size = [], 0
+    yield compress(b"".join(pending)) + finish()
+
+
+def init_compression(app):
+    """
+    Compress dynamic responses with brotli or gzip, as negotiated with the client.
+
+    Complete responses are compressed when they reach COMPRESS_MIN_SIZE bytes.
+    Streamed responses have an unknown size and are always compressed on the fly.
+    File responses (e.g. static files) are left alone, they are served
+    precompressed where available.
+    Args:
+        app (Flask): The Flask application.
+    """
+    app.config.setdefault('COMPRESS_MIN_SIZE', 1024)
+    app.config.setdefault('COMPRESS_LEVEL', 6)
+    app.config.setdefault('COMPRESS_BR_QUALITY', 4)
+    app.config.setdefault('COMPRESS_STREAM_BUFFER', 8192)
+    if brotli is None:
+        logging.info("Brotli is not installed; responses are compressed with gzip only.")
+
+    @app.after_request
+    def compress_response(response):
+        """Compress the response body if it is worth it and the client accepts it."""
+        if (response.direct_passthrough
+                or response.status_code < 200 or response.status_code in (204, 304)
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+            return response
+
+        response.vary.add('Accept-Encoding')
+        encoding = _choose_encoding()
+        if not encoding:
+            return response
+
+        level = app.config['COMPRESS_LEVEL']
+        br_quality = app.config['COMPRESS_BR_QUALITY']
+
+        if response.is_streamed:
+            # The original iterable still needs closing, e.g. to pop a streamed context
+            original = response.response
+            if hasattr(original, 'close'):
+                response.call_on_close(original.close)
+            response.response = _compress_stream(response.iter_encoded(), encoding, level,
+                                                 br_quality, app.config['COMPRESS_STREAM_BUFFER'])
+            response.headers.pop('Content-Length', None)
+        else:
+            body = response.get_data()
+            if len(body) < app.config['COMPRESS_MIN_SIZE']:
+                return response
+            response.set_data(_compress(body, encoding, level, br_quality))
+            logging.debug(f"Compressed response from {len(body)} to "
+                          f"{response.content_length} bytes ({encoding}).")
+
+        response.content_encoding = encoding
+        return response
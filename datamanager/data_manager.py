@@ -1,6 +1,9 @@
 from abc import ABC, abstractmethod
 from datamanager.data_models import User, Movie
 
+# Movie attributes the movie lists can be sorted by
+SORT_FIELDS = ('title', 'rating', 'release_year', 'director')
+
 
 class DataManagerInterface(ABC):
     """
@@ -18,11 +21,20 @@ class DataManagerInterface(ABC):
         pass
 
     @abstractmethod
-    def get_user_movies(self, user_id: int) -> list[Movie]:
+    def get_user_movies(self, user_id: int, sort: str = None, descending: bool = False,
+                        director: str = None, min_rating: float = None, max_rating: float = None,
+                        min_year: int = None, max_year: int = None) -> list[Movie]:
         """
         Retrieve all movies associated with a specific user.
         Args:
             user_id (int): The unique identifier of the user.
+            sort (str, optional): One of SORT_FIELDS. Defaults to insertion order.
+            descending (bool, optional): Sort in descending order.
+            director (str, optional): Only movies by this director.
+            min_rating (float, optional): Only movies rated at least this.
+            max_rating (float, optional): Only movies rated at most this.
+            min_year (int, optional): Only movies released in or after this year.
+            max_year (int, optional): Only movies released in or before this year.
         Returns:
             list[Movie]: A list of movies associated with the user.
         """
@@ -63,7 +75,8 @@ class DataManagerInterface(ABC):
         pass
 
     @abstractmethod
-    def add_movie(self, user_id, title, release_year=None, director=None, rating=None, poster=None):
+    def add_movie(self, user_id, title, release_year=None, director=None, rating=None, poster=None,
+                  imdb_id=None):
         """
         Add a new movie to the database.
         Args:
@@ -73,6 +86,7 @@ class DataManagerInterface(ABC):
             director (str, optional): The director of the movie.
             rating (float, optional): The rating of the movie.
             poster (str, optional): The URL of the movie poster.
+            imdb_id (str, optional): The IMDb ID of the movie, used instead of the title.
         Returns:
             None
         """
@@ -93,20 +107,79 @@ class DataManagerInterface(ABC):
     @abstractmethod
     def update_movie(self, movie_id: int, user_id: int,  rating: float = None) -> None:
         """
-        Update the details of an existing movie.
+        Set a user's own rating of a movie in their collection.
         Args:
-            movie_id (int): The unique identifier of the movie to update.
-            user_id (int): The unique identifier of the user to update.
-            rating (float, optional): The new rating of the movie.
+            movie_id (int): The unique identifier of the movie to rate.
+            user_id (int): The unique identifier of the user rating the movie.
+            rating (float, optional): The user's rating, or None to remove it.
         Returns:
             None
         """
         pass
 
     @abstractmethod
-    def get_all_movies(self) -> list[Movie]:
+    def delete_movies(self, user_id: int, movie_ids: list[int]) -> int:
+        """
+        Remove several movies from a user's collection in a single transaction.
+        Args:
+            user_id (int): The unique identifier of the user.
+            movie_ids (list[int]): The unique identifiers of the movies to remove.
+        Returns:
+            int: The number of movies removed.
+        """
+        pass
+
+    @abstractmethod
+    def update_movies(self, user_id: int, ratings: dict[int, float]) -> int:
+        """
+        Set a user's own ratings of several movies in their collection in a single transaction.
+        Args:
+            user_id (int): The unique identifier of the user.
+            ratings (dict[int, float]): The user's new rating for each movie identifier.
+        Returns:
+            int: The number of movies updated.
+        """
+        pass
+
+    @abstractmethod
+    def move_movies(self, user_id: int, target_user_id: int, movie_ids: list[int]) -> int:
+        """
+        Move several movies from one user's collection to another's in a single transaction.
+        Args:
+            user_id (int): The unique identifier of the user the movies are taken from.
+            target_user_id (int): The unique identifier of the user the movies are given to.
+            movie_ids (list[int]): The unique identifiers of the movies to move.
+        Returns:
+            int: The number of movies moved.
+        """
+        pass
+
+    @abstractmethod
+    def link_movies(self, user_id: int, ratings: dict[int, float]) -> int:
+        """
+        Add several stored movies to a user's collection in a single transaction.
+        Args:
+            user_id (int): The unique identifier of the user.
+            ratings (dict[int, float]): The user's rating for each movie identifier, or None.
+        Returns:
+            int: The number of movies newly added to the collection.
+        """
+        pass
+
+    @abstractmethod
+    def get_all_movies(self, sort: str = None, descending: bool = False,
+                       director: str = None, min_rating: float = None, max_rating: float = None,
+                       min_year: int = None, max_year: int = None) -> list[Movie]:
         """
         Retrieve all movies from the database.
+        Args:
+            sort (str, optional): One of SORT_FIELDS. Defaults to insertion order.
+            descending (bool, optional): Sort in descending order.
+            director (str, optional): Only movies by this director.
+            min_rating (float, optional): Only movies rated at least this.
+            max_rating (float, optional): Only movies rated at most this.
+            min_year (int, optional): Only movies released in or after this year.
+            max_year (int, optional): Only movies released in or before this year.
         Returns:
             list[Movie]: A list of all movie objects.
         """
@@ -1,8 +1,14 @@
+from datetime import datetime, timezone
 from flask_sqlalchemy import SQLAlchemy
 
 db = SQLAlchemy()
 
 
+def utcnow():
+    """Return the current UTC time as a naive datetime, the format stored in SQLite."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
 class User(db.Model):
     """
     Represents a user in the application.
@@ -36,34 +42,65 @@ class Movie(db.Model):
     """
     Represents a movie in the application.
 
-    This class defines a movie with attributes like `id`, `title`, `release_year`, `poster`,
-    `director`, and `rating`. It also establishes a relationship to the `UserMovies` model,
+    This class defines a movie with attributes like `id`, `imdb_id`, `title`, `release_year`,
+    `poster`, `director`, and `rating`. It also establishes a relationship to the `UserMovies` model,
     which tracks the many-to-many relationship between movies and users.
 
     Attributes:
         id (int): The unique identifier for the movie.
+        imdb_id (str): The OMDb/IMDb ID of the movie, e.g. 'tt0133093'. It is the
+                       canonical key used to deduplicate movies.
         title (str): The title of the movie.
         release_year (int): The release year of the movie.
         poster (str): A URL to the movie's poster image.
         director (str): The director of the movie.
-        rating (float): The IMDb rating of the movie.
+        rating (float): The IMDb rating of the movie, or None if OMDb has none.
+        rating_count (int): The number of users who rated the movie.
+        rating_sum (float): The sum of those users' ratings. Both are updated in the
+                            same transaction as every rating change, so the average
+                            needs no scan of the ratings.
+        refreshed_at (datetime): When the OMDb metadata was last fetched. Rows that
+                                 predate this column start at the Unix epoch so the
+                                 refresher picks them up first.
         user_movies (relationship): A relationship to the `UserMovies` table for tracking
                                      which users have this movie in their collection.
     """
     __tablename__ = 'movies'
+    __table_args__ = (
+        # Supports the refresher's stalest-first keyset scan
+        db.Index('ix_movies_refreshed_at_id', 'refreshed_at', 'id'),
+        # One per supported list ordering; the id breaks ties so pages are stable
+        db.Index('ix_movies_rating_id', 'rating', 'id'),
+        db.Index('ix_movies_release_year_id', 'release_year', 'id'),
+        db.Index('ix_movies_director_id', 'director', 'id'),
+        db.Index('ix_movies_title_id', 'title', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    imdb_id = db.Column(db.String, nullable=True, unique=True, index=True)
     title = db.Column(db.String, nullable=False)
     release_year = db.Column(db.Integer, nullable=True)
     poster = db.Column(db.String, nullable=True)
     director = db.Column(db.String, nullable=True)
-    rating = db.Column(db.Float, nullable=False)
+    rating = db.Column(db.Float, nullable=True)
+    rating_count = db.Column(db.Integer, nullable=False, default=0, server_default=db.text("0"))
+    rating_sum = db.Column(db.Float, nullable=False, default=0.0, server_default=db.text("0"))
+    refreshed_at = db.Column(db.DateTime, nullable=False, default=utcnow,
+                             server_default=db.text("'1970-01-01 00:00:00.000000'"))
 
     # Relationship to UserMovies
     user_movies = db.relationship('UserMovies', back_populates='movie', cascade="all, delete")
 
+    @property
+    def average_rating(self):
+        """The average of the users' ratings, or None if no user rated the movie."""
+        if not self.rating_count:
+            return None
+        return round(self.rating_sum / self.rating_count, 1)
+
     def __repr__(self):
-        return (f"Movie(id = {self.id}, title = {self.title}, release_year = {self.release_year}, "
+        return (f"Movie(id = {self.id}, imdb_id = {self.imdb_id}, title = {self.title}, "
+                f"release_year = {self.release_year}, "
                 f"poster = {self.poster}, director = {self.director}, rating = {self.rating})")
 
     def __str__(self):
@@ -81,18 +118,70 @@ class UserMovies(db.Model):
         id (int): The unique identifier for the record.
         user_id (int): The ID of the user from the `users` table.
         movie_id (int): The ID of the movie from the `movies` table.
+        rating (float): The user's own rating of the movie, or None if not rated.
         user (relationship): A relationship to the `User` model.
         movie (relationship): A relationship to the `Movie` model.
     """
     __tablename__ = 'user_movies'
+    __table_args__ = (
+        # Resolves a user's collection without scanning every link, and keeps
+        # concurrent adds of the same movie from linking it twice
+        db.Index('uq_user_movies_user_id_movie_id', 'user_id', 'movie_id', unique=True),
+    )
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     movie_id = db.Column(db.Integer, db.ForeignKey('movies.id'), nullable=False)
+    rating = db.Column(db.Float, nullable=True)
 
     # Relationships
     user = db.relationship('User', back_populates='user_movies')
     movie = db.relationship('Movie', back_populates='user_movies')
 
     def __repr__(self):
-        return f"UserMovies(id = {self.id}, user_id = {self.user_id}, movie_id = {self.movie_id})"
+        return (f"UserMovies(id = {self.id}, user_id = {self.user_id}, "
+                f"movie_id = {self.movie_id}, rating = {self.rating})")
+
+
+class ChangeLog(db.Model):
+    """
+    Represents one entry of the ordered change log.
+
+    Every insert, update and delete on the `users`, `movies` and `user_movies`
+    tables appends an entry, written by database triggers in the same
+    transaction as the change. Downstream caches and replicas read the log in
+    `seq` order to sync incrementally. Old entries are removed by compaction.
+
+    Attributes:
+        seq (int): The sequence number. It only ever increases and is never reused.
+        entity (str): The kind of row that changed: 'user', 'movie' or 'user_movie'.
+        operation (str): 'insert', 'update' or 'delete'.
+        entity_id (int): The ID of the row that changed.
+        changed_at (datetime): When the change was committed (UTC).
+    """
+    __tablename__ = 'change_log'
+    __table_args__ = (
+        db.Index('ix_change_log_changed_at', 'changed_at'),
+        # AUTOINCREMENT keeps sequence numbers from being reused after compaction
+        {'sqlite_autoincrement': True},
+    )
+
+    seq = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    entity = db.Column(db.String, nullable=False)
+    operation = db.Column(db.String, nullable=False)
+    entity_id = db.Column(db.Integer, nullable=False)
+    changed_at = db.Column(db.DateTime, nullable=False, default=utcnow)
+
+    def to_dict(self):
+        """Return the entry as a JSON-serializable dictionary."""
+        return {
+            "seq": self.seq,
+            "entity": self.entity,
+            "operation": self.operation,
+            "id": self.entity_id,
+            "changed_at": self.changed_at.isoformat(),
+        }
+
+    def __repr__(self):
+        return (f"ChangeLog(seq = {self.seq}, entity = {self.entity}, "
+                f"operation = {self.operation}, entity_id = {self.entity_id})")
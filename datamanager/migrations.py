@@ -0,0 +1,163 @@
+import logging
+from sqlalchemy import MetaData, inspect, text
+
+
+def _column_ddl(column, dialect):
+    """
+    Build the column definition used by ALTER TABLE ... ADD COLUMN.
+
+    SQLite only accepts NOT NULL on an added column when it also has a default,
+    so the constraint is emitted only alongside a server default.
+    Args:
+        column (Column): The model column to add.
+        dialect: The SQLAlchemy dialect of the target database.
+    Returns:
+        str: The column definition.
+    """
+    ddl = f"{column.name} {column.type.compile(dialect=dialect)}"
+    if column.server_default is not None:
+        default = column.server_default.arg
+        default = getattr(default, 'text', default)
+        ddl += f" DEFAULT {default}"
+        if not column.nullable:
+            ddl += " NOT NULL"
+    return ddl
+
+
+def _rebuild_table(conn, table):
+    """
+    Recreate a table from its model definition, keeping its rows.
+
+    SQLite cannot change a column's constraints in place, so the table is copied
+    into a new one created from the model, the old table is dropped and the new
+    one renamed. Its indexes are recreated by the caller. All of it happens in
+    one transaction, so an interrupted rebuild leaves the table as it was.
+    Args:
+        conn (Connection): A connection inside a transaction.
+        table (Table): The model's table.
+    """
+    logging.info(f"Rebuilding table '{table.name}' to match the model.")
+    metadata = MetaData()
+    # Referenced tables are copied too, so the foreign keys can be compiled
+    for foreign_key in table.foreign_keys:
+        foreign_key.column.table.to_metadata(metadata)
+    new_table = table.to_metadata(metadata, name=f"_{table.name}_new")
+    for index in list(new_table.indexes):
+        new_table.indexes.discard(index)
+
+    # pysqlite only opens a transaction before DML, which would leave the CREATE outside it
+    if not conn.connection.driver_connection.in_transaction:
+        conn.exec_driver_sql("BEGIN")
+    # A copy left behind by an upgrade interrupted before rebuilds were atomic
+    conn.execute(text(f"DROP TABLE IF EXISTS {new_table.name}"))
+    new_table.create(conn)
+
+    existing = {row[1] for row in conn.execute(text(f"PRAGMA table_info({table.name})"))}
+    columns = ", ".join(column.name for column in table.columns if column.name in existing)
+    conn.execute(text(f"INSERT INTO {new_table.name} ({columns}) SELECT {columns} FROM {table.name}"))
+    conn.execute(text(f"DROP TABLE {table.name}"))
+    conn.execute(text(f"ALTER TABLE {new_table.name} RENAME TO {table.name}"))
+
+
+def _normalize_movie_numbers(conn):
+    """
+    Store release years and ratings as real numbers.
+
+    Older rows may hold the raw OMDb strings, e.g. a year of '2010–2013' or a
+    rating of 'N/A'. SQLite compares text and numbers differently and cannot use
+    an index for a numeric range over text, so years become their first year as
+    an INTEGER, numeric ratings become REAL, and anything else becomes NULL.
+    """
+    conn.execute(text(
+        "UPDATE movies SET release_year = CASE "
+        "WHEN substr(release_year, 1, 4) GLOB '[0-9][0-9][0-9][0-9]' "
+        "THEN CAST(substr(release_year, 1, 4) AS INTEGER) ELSE NULL END "
+        "WHERE typeof(release_year) NOT IN ('integer', 'null')"
+    ))
+    conn.execute(text(
+        "UPDATE movies SET rating = CASE "
+        "WHEN trim(rating) GLOB '[0-9]*' AND trim(rating) NOT GLOB '*[^0-9.]*' "
+        "THEN CAST(trim(rating) AS REAL) ELSE NULL END "
+        "WHERE typeof(rating) NOT IN ('real', 'null')"
+    ))
+
+
+def _deduplicate_user_movies(conn):
+    """
+    Remove repeated links between the same user and movie, keeping the oldest.
+
+    Links are unique from now on; rows stored before that could contain
+    duplicates, which would keep the unique index from being created. The
+    non-unique index it replaces is dropped.
+    """
+    conn.execute(text(
+        "DELETE FROM user_movies WHERE id NOT IN "
+        "(SELECT min(id) FROM user_movies GROUP BY user_id, movie_id)"
+    ))
+    conn.execute(text("DROP INDEX IF EXISTS ix_user_movies_user_id_movie_id"))
+
+
+# Tables whose changes are recorded in the change log, and their entity names
+CHANGE_TRACKED_TABLES = {'users': 'user', 'movies': 'movie', 'user_movies': 'user_movie'}
+
+
+def _create_change_triggers(conn):
+    """
+    Create the triggers that append every row change to the change log.
+
+    Triggers run inside the transaction that makes the change, so the log never
+    misses a change, including set-based statements that touch many rows.
+    Timestamps use the microsecond format SQLAlchemy stores DateTimes in.
+    """
+    for table, entity in CHANGE_TRACKED_TABLES.items():
+        for event, operation, row in (('INSERT', 'insert', 'NEW'),
+                                      ('UPDATE', 'update', 'NEW'),
+                                      ('DELETE', 'delete', 'OLD')):
+            conn.execute(text(
+                f"CREATE TRIGGER IF NOT EXISTS trg_{table}_{operation}_change_log "
+                f"AFTER {event} ON {table} BEGIN "
+                f"INSERT INTO change_log (entity, operation, entity_id, changed_at) "
+                f"VALUES ('{entity}', '{operation}', {row}.id, "
+                f"strftime('%Y-%m-%d %H:%M:%f', 'now') || '000'); "
+                f"END"
+            ))
+
+
+def upgrade_schema(db):
+    """
+    Bring an existing database up to date with the current models.
+
+    Creates missing tables, adds columns that were introduced after the database
+    was created, rebuilds tables whose NOT NULL constraints were relaxed, creates
+    any missing indexes and change-log triggers and normalizes stored values.
+    Every step is idempotent, so this is safe to run on each start-up.
+    Args:
+        db (SQLAlchemy): The Flask-SQLAlchemy extension bound to the app.
+    """
+    engine = db.engine
+    db.metadata.create_all(engine)
+
+    with engine.begin() as conn:
+        # Reflect through the upgrading connection; another one would wait on its locks
+        inspector = inspect(conn)
+        for table in db.metadata.sorted_tables:
+            columns = {column['name']: column for column in inspector.get_columns(table.name)}
+            if any(column.nullable and not columns[column.name]['nullable']
+                   for column in table.columns if column.name in columns):
+                _rebuild_table(conn, table)
+                columns = {column.name: None for column in table.columns}
+
+            existing = set(columns)
+            for column in table.columns:
+                if column.name not in existing:
+                    logging.info(f"Adding column '{column.name}' to table '{table.name}'.")
+                    conn.execute(text(f"ALTER TABLE {table.name} "
+                                      f"ADD COLUMN {_column_ddl(column, engine.dialect)}"))
+
+        _deduplicate_user_movies(conn)
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+
+        _create_change_triggers(conn)
+        _normalize_movie_numbers(conn)
@@ -1,9 +1,30 @@
 import logging
-from datamanager.data_models import db, User, Movie, UserMovies
-from datamanager.data_manager import DataManagerInterface
-from sqlalchemy.exc import SQLAlchemyError
+import os
+import threading
+import weakref
+from datetime import timedelta
+from datamanager.data_models import db, utcnow, User, Movie, UserMovies, ChangeLog
+from datamanager.data_manager import DataManagerInterface, SORT_FIELDS
+from datamanager.migrations import upgrade_schema
+from sqlalchemy import case, delete, exists, func, or_, select, update
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 from api_helper import fetch_movie_data
 
+# Data managers still in use; a forked child drops their inherited connections
+_live_managers = weakref.WeakSet()
+
+
+def _dispose_after_fork():
+    """Drop the pooled connections a forked child inherited from its parent."""
+    for manager in list(_live_managers):
+        manager._dispose_connections()
+
+
+# Registered once per process, since fork hooks can never be removed
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_dispose_after_fork)
+
 
 class SQLiteDataManager(DataManagerInterface):
     """
@@ -13,11 +34,37 @@ class SQLiteDataManager(DataManagerInterface):
     def __init__(self, app):
         """
         Initialize the SQLiteDataManager with the Flask app instance.
+        No connection is opened until the data manager is first used.
         Args:
             app: The Flask application instance.
         """
         db.init_app(app)
         self.db = db
+        self.app = app
+        self._schema_ready = False
+        self._schema_lock = threading.Lock()
+
+        # Pooled connections must not be shared with forked worker processes
+        _live_managers.add(self)
+
+    def _dispose_connections(self):
+        """Drop the connections inherited from the parent process without closing them."""
+        with self.app.app_context():
+            for engine in self.db.engines.values():
+                engine.dispose(close=False)
+
+    def ensure_schema(self):
+        """
+        Create missing tables, columns and indexes the first time it is called.
+        Later calls return immediately.
+        """
+        if self._schema_ready:
+            return
+        with self._schema_lock:
+            if not self._schema_ready:
+                with self.app.app_context():
+                    upgrade_schema(self.db)
+                self._schema_ready = True
 
     def get_all_users(self):
         """
@@ -31,21 +78,71 @@ class SQLiteDataManager(DataManagerInterface):
             logging.error(f"Error fetching all users: {e}")
             return []
 
-    def get_user_movies(self, user_id):
+    @staticmethod
+    def _apply_list_options(query, sort=None, descending=False, director=None,
+                            min_rating=None, max_rating=None, min_year=None, max_year=None):
+        """
+        Add the filters and ordering of a movie list to a query, so SQLite does the work.
+        Each ordering ends with the movie ID, matching the composite indexes on `movies`.
+        Args:
+            query (Query): A query selecting movies.
+            sort (str, optional): One of SORT_FIELDS. Defaults to the movie ID.
+            descending (bool, optional): Sort in descending order.
+            director (str, optional): Only movies by this director.
+            min_rating (float, optional): Only movies rated at least this.
+            max_rating (float, optional): Only movies rated at most this.
+            min_year (int, optional): Only movies released in or after this year.
+            max_year (int, optional): Only movies released in or before this year.
+        Returns:
+            Query: The filtered and ordered query.
+        """
+        if sort is not None and sort not in SORT_FIELDS:
+            raise ValueError(f"Cannot sort movies by '{sort}'.")
+
+        if director:
+            query = query.filter(Movie.director == director)
+        if min_rating is not None:
+            query = query.filter(Movie.rating >= min_rating)
+        if max_rating is not None:
+            query = query.filter(Movie.rating <= max_rating)
+        if min_year is not None:
+            query = query.filter(Movie.release_year >= min_year)
+        if max_year is not None:
+            query = query.filter(Movie.release_year <= max_year)
+
+        columns = [getattr(Movie, sort)] if sort else []
+        columns.append(Movie.id)
+        return query.order_by(*(column.desc() if descending else column for column in columns))
+
+    def get_user_movies(self, user_id, sort=None, descending=False, director=None,
+                        min_rating=None, max_rating=None, min_year=None, max_year=None):
         """
         Retrieve all movies associated with a specific user.
         Args:
             user_id (int): The ID of the user whose movies are to be retrieved.
+            sort (str, optional): One of SORT_FIELDS. Defaults to the order movies were stored.
+            descending (bool, optional): Sort in descending order.
+            director (str, optional): Only movies by this director.
+            min_rating (float, optional): Only movies rated at least this.
+            max_rating (float, optional): Only movies rated at most this.
+            min_year (int, optional): Only movies released in or after this year.
+            max_year (int, optional): Only movies released in or before this year.
         Returns:
-            List[Movie]: A list of all movie objects associated with the user.
+            List[Movie]: A list of all movie objects associated with the user. Each
+                         carries the user's own rating as `user_rating`.
         """
         # Query the movies linked to this user via the UserMovies table
-        movies = (
-            self.db.session.query(Movie)
+        query = (
+            self.db.session.query(Movie, UserMovies.rating)
             .join(UserMovies, UserMovies.movie_id == Movie.id)
             .filter(UserMovies.user_id == user_id)
-            .all()
         )
+        query = self._apply_list_options(query, sort, descending, director,
+                                         min_rating, max_rating, min_year, max_year)
+        movies = []
+        for movie, user_rating in query.all():
+            movie.user_rating = user_rating
+            movies.append(movie)
         return movies
 
     def get_user(self, user_id):
@@ -96,7 +193,8 @@ class SQLiteDataManager(DataManagerInterface):
             user_movies = self.db.session.query(UserMovies).filter_by(user_id=user_id).all()
             movie_ids = [user_movie.movie_id for user_movie in user_movies]
 
-            # Delete the user's entries in UserMovies
+            # Delete the user's entries in UserMovies, taking their ratings out of the totals
+            self._remove_ratings(UserMovies.user_id == user_id)
             self.db.session.query(UserMovies).filter_by(user_id=user_id).delete()
 
             # Delete the user
@@ -161,16 +259,35 @@ class SQLiteDataManager(DataManagerInterface):
             logging.error(f"Error fetching movie with ID {movie_id}: {e}")
             raise  # Re-raise the original exception
 
-    def add_movie(self, user_id, title, release_year=None, director=None, rating=None, poster=None):
+    def get_movie_by_imdb_id(self, imdb_id):
+        """
+        Retrieve a specific movie by its IMDb ID.
+        Args:
+            imdb_id (str): The IMDb ID of the movie, e.g. 'tt0133093'.
+        Returns:
+            Movie: The movie object if found, None otherwise.
+        """
+        try:
+            return self.db.session.query(Movie).filter(Movie.imdb_id == imdb_id).one_or_none()
+        except SQLAlchemyError as e:
+            logging.error(f"Error fetching movie with IMDb ID {imdb_id}: {e}")
+            raise  # Re-raise the original exception
+
+    def add_movie(self, user_id, title, release_year=None, director=None, rating=None, poster=None,
+                  imdb_id=None):
         """
         Add a new movie to the database and link it to a user.
+        Movies are deduplicated on their IMDb ID.
         Args:
             user_id (int): The ID of the user adding the movie.
             title (str): The title of the movie.
-            release_year (int, optional): The release year of the movie. Defaults to None.
+            release_year (int, optional): The release year of the movie, also used to
+                                          narrow the OMDb title search. Defaults to None.
             director (str, optional): The director of the movie. Defaults to None.
             rating (float, optional): The rating of the movie. Defaults to None.
             poster (str, optional): The poster image URL for the movie. Defaults to None.
+            imdb_id (str, optional): The IMDb ID of the movie. When given, the movie is
+                                     looked up by ID instead of by title. Defaults to None.
         Returns:
             dict: A dictionary indicating the result of the operation.
                     {
@@ -178,56 +295,132 @@ class SQLiteDataManager(DataManagerInterface):
                         "movie": <Movie object> | None
                     }
         """
-        # Fetch additional movie data from OMDb if not provided
-        movie_data = fetch_movie_data(title)
-
-        # If no valid movie data is found, return 'not_found' status
-        if not movie_data:
-            return {"status": "not_found", "movie": None}
-
-        # Proceed with the rest of the logic if movie data is found
-        title = movie_data['title']
-        director = director or movie_data['director']
-        rating = rating or movie_data['rating']
-        poster = poster or movie_data['poster']
-        release_year = release_year or movie_data['release_year']
-
-        # Check if the movie already exists in the database
-        existing_movie = (
-            self.db.session.query(Movie)
-            .filter_by(title=title, release_year=release_year)
-            .first()
-        )
+        # A movie already stored under this ID needs no OMDb request at all
+        existing_movie = self.get_movie_by_imdb_id(imdb_id) if imdb_id else None
+
+        if not existing_movie:
+            # Fetch additional movie data from OMDb if not provided
+            movie_data = fetch_movie_data(title, imdb_id=imdb_id, year=release_year)
+
+            # If no valid movie data is found, return 'not_found' status
+            if not movie_data:
+                return {"status": "not_found", "movie": None}
+
+            # Proceed with the rest of the logic if movie data is found
+            imdb_id = movie_data['imdb_id']
+            title = movie_data['title']
+            director = director or movie_data['director']
+            rating = rating or movie_data['rating']
+            poster = poster or movie_data['poster']
+            release_year = release_year or movie_data['release_year']
+
+            # Check if the movie already exists in the database
+            existing_movie = self.get_movie_by_imdb_id(imdb_id)
 
         if not existing_movie:
-            # Create a new movie and add it to the database
-            new_movie = Movie(
+            # Rows stored before IMDb IDs were recorded are adopted instead of duplicated
+            existing_movie = (
+                self.db.session.query(Movie)
+                .filter_by(imdb_id=None, title=title, release_year=release_year)
+                .first()
+            )
+            if existing_movie:
+                try:
+                    existing_movie.imdb_id = imdb_id
+                    self.db.session.commit()
+                except IntegrityError:
+                    # A concurrent request stored the movie under this ID first
+                    self.db.session.rollback()
+                    existing_movie = self.get_movie_by_imdb_id(imdb_id)
+
+        if not existing_movie:
+            existing_movie = self._insert_or_get_movie(
+                imdb_id=imdb_id,
                 title=title,
                 release_year=release_year,
                 director=director,
                 rating=rating,
                 poster=poster,
             )
-            self.db.session.add(new_movie)
-            self.db.session.commit()
-            existing_movie = new_movie
 
-        # Check if the movie is already linked to the user
-        user_movie = (
-            self.db.session.query(UserMovies)
-            .filter_by(user_id=user_id, movie_id=existing_movie.id)
-            .first()
+        # Link the movie to the user, unless a link already exists
+        result = self.db.session.execute(
+            insert(UserMovies)
+            .values(user_id=user_id, movie_id=existing_movie.id)
+            .on_conflict_do_nothing(index_elements=['user_id', 'movie_id'])
         )
+        self.db.session.commit()
 
-        if user_movie:
+        if not result.rowcount:
             return {"status": "linked", "movie": existing_movie}
 
-        # Link the movie to the user in the UserMovies table
-        user_movie = UserMovies(user_id=user_id, movie_id=existing_movie.id)
-        self.db.session.add(user_movie)
+        return {"status": "added", "movie": existing_movie}
+
+    def _insert_or_get_movie(self, **values):
+        """
+        Store a new movie, or return the one a concurrent request stored under the same IMDb ID.
+
+        The insert is skipped by the database when the IMDb ID already exists, so
+        requests adding the same movie at the same time all end up with one row.
+        Args:
+            **values: The column values of the movie, including 'imdb_id'.
+        Returns:
+            Movie: The stored movie.
+        """
+        if not values.get('imdb_id'):
+            movie = Movie(**values)
+            self.db.session.add(movie)
+            self.db.session.commit()
+            return movie
+
+        self.db.session.execute(
+            insert(Movie).values(**values).on_conflict_do_nothing(index_elements=['imdb_id'])
+        )
         self.db.session.commit()
+        return self.get_movie_by_imdb_id(values['imdb_id'])
 
-        return {"status": "added", "movie": existing_movie}
+    def assign_imdb_id(self, movie_id, imdb_id):
+        """
+        Record the IMDb ID of a movie stored before IDs were tracked.
+
+        If another movie already holds the ID, the two rows are duplicates: the
+        user links are moved to the movie holding the ID and this row is deleted.
+        Args:
+            movie_id (int): The ID of the movie to update.
+            imdb_id (str): The IMDb ID fetched for the movie.
+        Returns:
+            int: The ID of the movie that now carries the IMDb ID.
+        """
+        try:
+            movie = self.get_movie(movie_id)
+            canonical = self.get_movie_by_imdb_id(imdb_id)
+
+            if not canonical or canonical.id == movie.id:
+                movie.imdb_id = imdb_id
+                self.db.session.commit()
+                return movie.id
+
+            logging.info(f"Merging duplicate movie {movie.id} into {canonical.id} ({imdb_id}).")
+            linked_users = {
+                user_id for (user_id,) in
+                self.db.session.query(UserMovies.user_id).filter_by(movie_id=canonical.id)
+            }
+            for user_movie in self.db.session.query(UserMovies).filter_by(movie_id=movie.id).all():
+                if user_movie.user_id in linked_users:
+                    self.db.session.delete(user_movie)
+                else:
+                    user_movie.movie_id = canonical.id
+            self.db.session.flush()
+            self.db.session.expire(movie, ['user_movies'])
+            self.db.session.delete(movie)
+            self._recount_ratings([canonical.id])
+            self.db.session.commit()
+            return canonical.id
+
+        except SQLAlchemyError as e:
+            self.db.session.rollback()
+            logging.error(f"Error assigning IMDb ID {imdb_id} to movie {movie_id}: {e}")
+            raise ValueError(f"Could not assign IMDb ID {imdb_id} to movie {movie_id}.")
 
     def delete_movie(self, user_id, movie_id):
         """
@@ -253,6 +446,7 @@ class SQLiteDataManager(DataManagerInterface):
                 return None
 
             # Delete the relationship between the user and the movie
+            self._remove_ratings(UserMovies.id == user_movie.id)
             self.db.session.delete(user_movie)
 
             # If no other users are associated with the movie, delete it from the Movie table
@@ -270,34 +464,396 @@ class SQLiteDataManager(DataManagerInterface):
 
     def update_movie(self, movie_id, user_id, rating=None):
         """
-        Update the details of an existing movie in the database.
+        Set a user's own rating of a movie in their collection.
+        The movie's rating count and sum are updated in the same transaction.
         Args:
-            movie_id (int): The ID of the movie to update.
-            user_id (int): The ID of the user to update.
-            rating (float, optional): The new rating of the movie. Defaults to None.
+            movie_id (int): The ID of the movie to rate.
+            user_id (int): The ID of the user rating the movie.
+            rating (float, optional): The user's rating. None removes it.
         """
+        if not self.update_movies(user_id, {int(movie_id): rating}):
+            raise ValueError(f"Movie with ID {movie_id} is not in the collection of user {user_id}.")
 
-        movie_to_update = self.get_movie(movie_id)
-        if not movie_to_update:
-            raise ValueError(f"Movie with ID {movie_id} does not exist.")
+    def get_user_rating(self, user_id, movie_id):
+        """
+        Retrieve a user's own rating of a movie.
+        Args:
+            user_id (int): The ID of the user.
+            movie_id (int): The ID of the movie.
+        Returns:
+            float: The rating, or None if the user has not rated the movie.
+        """
+        return (
+            self.db.session.query(UserMovies.rating)
+            .filter_by(user_id=user_id, movie_id=movie_id)
+            .scalar()
+        )
 
-        # Update the rating if provided
-        movie_to_update.rating = rating or movie_to_update.rating
+    def _remove_ratings(self, *conditions):
+        """
+        Take the ratings of the links matching `conditions` out of their movies' totals.
+        Call it in the transaction that deletes those links, before deleting them.
+        Args:
+            *conditions: Filters on UserMovies selecting the links.
+        """
+        count = (select(func.count(UserMovies.rating))
+                 .where(UserMovies.movie_id == Movie.id, *conditions).scalar_subquery())
+        total = (select(func.coalesce(func.sum(UserMovies.rating), 0))
+                 .where(UserMovies.movie_id == Movie.id, *conditions).scalar_subquery())
+        rated = select(UserMovies.movie_id).where(UserMovies.rating.isnot(None), *conditions)
+        self.db.session.execute(
+            update(Movie)
+            .where(Movie.id.in_(rated))
+            .values(rating_count=Movie.rating_count - count, rating_sum=Movie.rating_sum - total)
+            .execution_options(synchronize_session=False)
+        )
 
-        self.db.session.commit()
+    def _recount_ratings(self, movie_ids):
+        """
+        Recompute the rating totals of movies from their links.
+        Only needed when links are merged from another movie.
+        Args:
+            movie_ids (list[int]): The IDs of the movies to recount.
+        """
+        self.db.session.execute(
+            update(Movie)
+            .where(Movie.id.in_(movie_ids))
+            .values(
+                rating_count=select(func.count(UserMovies.rating))
+                .where(UserMovies.movie_id == Movie.id).scalar_subquery(),
+                rating_sum=select(func.coalesce(func.sum(UserMovies.rating), 0))
+                .where(UserMovies.movie_id == Movie.id).scalar_subquery(),
+            )
+            .execution_options(synchronize_session=False)
+        )
+
+    def _delete_orphans(self, movie_ids):
+        """
+        Delete those of the given movies that no user has in their collection any more.
+        Runs inside the caller's transaction.
+        Args:
+            movie_ids (list[int]): IDs of movies that may have lost their last link.
+        Returns:
+            int: The number of movies deleted.
+        """
+        result = self.db.session.execute(
+            delete(Movie)
+            .where(Movie.id.in_(movie_ids))
+            .where(~exists().where(UserMovies.movie_id == Movie.id))
+        )
+        return result.rowcount
+
+    def delete_movies(self, user_id, movie_ids):
+        """
+        Remove several movies from a user's collection in one transaction.
+        Movies no other user has are deleted from the movie database afterwards.
+        Args:
+            user_id (int): The ID of the user whose collection is changed.
+            movie_ids (list[int]): The IDs of the movies to remove.
+        Returns:
+            int: The number of movies removed from the collection.
+        """
+        movie_ids = list(set(movie_ids))
+        try:
+            self._remove_ratings(UserMovies.user_id == user_id, UserMovies.movie_id.in_(movie_ids))
+            result = self.db.session.execute(
+                delete(UserMovies)
+                .where(UserMovies.user_id == user_id)
+                .where(UserMovies.movie_id.in_(movie_ids))
+            )
+            self._delete_orphans(movie_ids)
+            self.db.session.commit()
+            return result.rowcount
 
-    def get_all_movies(self):
+        except SQLAlchemyError as e:
+            self.db.session.rollback()
+            logging.error(f"Error deleting movies {movie_ids} for user {user_id}: {e}")
+            raise ValueError("Could not delete the selected movies. Please try again.")
+
+    def _set_ratings(self, user_id, ratings):
+        """
+        Set a user's own ratings and adjust the movies' totals, inside the caller's transaction.
+
+        Each movie's rating count and sum are adjusted by the difference between
+        the user's old and new rating, so no other ratings need to be read.
+        Args:
+            user_id (int): The ID of the user whose movies are re-rated.
+            ratings (dict[int, float]): The new rating for each movie ID; None removes it.
+        Returns:
+            int: The number of links updated.
+        """
+        linked = select(UserMovies.movie_id).where(UserMovies.user_id == user_id)
+        old = (select(UserMovies.rating)
+               .where(UserMovies.user_id == user_id, UserMovies.movie_id == Movie.id)
+               .scalar_subquery())
+        new = case(ratings, value=Movie.id)
+        self.db.session.execute(
+            update(Movie)
+            .where(Movie.id.in_(list(ratings)))
+            .where(Movie.id.in_(linked))
+            .values(
+                rating_count=Movie.rating_count
+                + case((new.isnot(None), 1), else_=0) - case((old.isnot(None), 1), else_=0),
+                rating_sum=Movie.rating_sum + func.coalesce(new, 0) - func.coalesce(old, 0),
+            )
+            .execution_options(synchronize_session=False)
+        )
+        result = self.db.session.execute(
+            update(UserMovies)
+            .where(UserMovies.user_id == user_id)
+            .where(UserMovies.movie_id.in_(list(ratings)))
+            .values(rating=case(ratings, value=UserMovies.movie_id))
+            .execution_options(synchronize_session=False)
+        )
+        return result.rowcount
+
+    def update_movies(self, user_id, ratings):
+        """
+        Set a user's own ratings of several movies in their collection in one transaction.
+        The movies' rating totals are updated in the same transaction.
+        Movies that are not in the user's collection are left unchanged.
+        Args:
+            user_id (int): The ID of the user whose movies are re-rated.
+            ratings (dict[int, float]): The new rating for each movie ID; None removes it.
+        Returns:
+            int: The number of movies updated.
+        """
+        if not ratings:
+            return 0
+        try:
+            count = self._set_ratings(user_id, ratings)
+            self.db.session.commit()
+            return count
+
+        except SQLAlchemyError as e:
+            self.db.session.rollback()
+            logging.error(f"Error updating ratings {ratings} for user {user_id}: {e}")
+            raise ValueError("Could not update the selected movies. Please try again.")
+
+    def link_movies(self, user_id, ratings):
+        """
+        Add several stored movies to a user's collection in one transaction, e.g. for an import.
+        Movies already in the collection keep their link; given ratings replace the user's own.
+        Args:
+            user_id (int): The ID of the user whose collection is extended.
+            ratings (dict[int, float]): The user's rating for each movie ID, or None for no rating.
+        Returns:
+            int: The number of movies newly added to the collection.
+        """
+        if not ratings:
+            return 0
+        try:
+            result = self.db.session.execute(
+                insert(UserMovies)
+                .values([{"user_id": user_id, "movie_id": movie_id} for movie_id in ratings])
+                .on_conflict_do_nothing(index_elements=['user_id', 'movie_id'])
+            )
+            rated = {movie_id: rating for movie_id, rating in ratings.items() if rating is not None}
+            if rated:
+                self._set_ratings(user_id, rated)
+            self.db.session.commit()
+            return result.rowcount
+
+        except SQLAlchemyError as e:
+            self.db.session.rollback()
+            logging.error(f"Error linking movies {list(ratings)} to user {user_id}: {e}")
+            raise ValueError("Could not add the movies to the collection. Please try again.")
+
+    def move_movies(self, user_id, target_user_id, movie_ids):
+        """
+        Move several movies from one user's collection to another's in one transaction.
+        Movies the target user already has are simply removed from the source collection.
+        Args:
+            user_id (int): The ID of the user the movies are taken from.
+            target_user_id (int): The ID of the user the movies are given to.
+            movie_ids (list[int]): The IDs of the movies to move.
+        Returns:
+            int: The number of movies removed from the source collection.
+        """
+        movie_ids = list(set(movie_ids))
+        # Raises ValueError if the target user does not exist
+        self.get_user(target_user_id)
+        try:
+            already_linked = select(UserMovies.movie_id).where(UserMovies.user_id == target_user_id)
+            moved = self.db.session.execute(
+                update(UserMovies)
+                .where(UserMovies.user_id == user_id)
+                .where(UserMovies.movie_id.in_(movie_ids))
+                .where(UserMovies.movie_id.not_in(already_linked))
+                .values(user_id=target_user_id)
+                .execution_options(synchronize_session=False)
+            )
+            # Whatever is left was a duplicate of a movie the target user already had;
+            # moved links keep their rating, so only the duplicates leave the totals
+            self._remove_ratings(UserMovies.user_id == user_id, UserMovies.movie_id.in_(movie_ids))
+            duplicates = self.db.session.execute(
+                delete(UserMovies)
+                .where(UserMovies.user_id == user_id)
+                .where(UserMovies.movie_id.in_(movie_ids))
+            )
+            self.db.session.commit()
+            return moved.rowcount + duplicates.rowcount
+
+        except SQLAlchemyError as e:
+            self.db.session.rollback()
+            logging.error(f"Error moving movies {movie_ids} from user {user_id} "
+                          f"to user {target_user_id}: {e}")
+            raise ValueError("Could not move the selected movies. Please try again.")
+
+    def get_all_movies(self, sort=None, descending=False, director=None,
+                       min_rating=None, max_rating=None, min_year=None, max_year=None):
         """
         Retrieve all movies from the database.
+        Args:
+            sort (str, optional): One of SORT_FIELDS. Defaults to the order movies were stored.
+            descending (bool, optional): Sort in descending order.
+            director (str, optional): Only movies by this director.
+            min_rating (float, optional): Only movies rated at least this.
+            max_rating (float, optional): Only movies rated at most this.
+            min_year (int, optional): Only movies released in or after this year.
+            max_year (int, optional): Only movies released in or before this year.
         Returns:
         List[User]: A list of all movie objects.
         """
         try:
-            return self.db.session.query(Movie).all()
+            query = self._apply_list_options(self.db.session.query(Movie), sort, descending,
+                                             director, min_rating, max_rating, min_year, max_year)
+            return query.all()
         except SQLAlchemyError as e:
             logging.error(f"Error fetching all movies: {e}")
             return []
 
+    def get_directors(self):
+        """
+        Retrieve the distinct directors of all stored movies, for the list filters.
+        Returns:
+            List[str]: The directors in alphabetical order.
+        """
+        try:
+            rows = (
+                self.db.session.query(Movie.director)
+                .filter(Movie.director.isnot(None))
+                .distinct()
+                .order_by(Movie.director)
+            )
+            return [director for (director,) in rows]
+        except SQLAlchemyError as e:
+            logging.error(f"Error fetching directors: {e}")
+            return []
+
+    def get_changes(self, since=0, until=None, limit=500):
+        """
+        Retrieve change-log entries in sequence order.
+        Args:
+            since (int, optional): Only entries after this sequence number.
+            until (int, optional): Only entries up to and including this sequence number.
+            limit (int, optional): The maximum number of entries returned.
+        Returns:
+            List[ChangeLog]: The entries, oldest first.
+        """
+        query = self.db.session.query(ChangeLog).filter(ChangeLog.seq > since)
+        if until is not None:
+            query = query.filter(ChangeLog.seq <= until)
+        return query.order_by(ChangeLog.seq).limit(limit).all()
+
+    def get_change_log_bounds(self):
+        """
+        Retrieve the oldest and newest sequence numbers still in the change log.
+        Returns:
+            tuple: (oldest, newest), both None if nothing has been logged yet.
+        """
+        return self.db.session.query(func.min(ChangeLog.seq), func.max(ChangeLog.seq)).one()
+
+    def compact_change_log(self, max_age=timedelta(days=7), max_rows=100000):
+        """
+        Delete change-log entries that are older than `max_age` or beyond the newest `max_rows`.
+
+        The newest entry is always kept, so readers can tell that entries they
+        have not seen were compacted away and a full resync is needed.
+        Args:
+            max_age (timedelta, optional): Keep entries younger than this.
+            max_rows (int, optional): Keep at most this many entries.
+        Returns:
+            int: The number of entries deleted.
+        """
+        try:
+            newest = self.db.session.query(func.max(ChangeLog.seq)).scalar()
+            if newest is None:
+                return 0
+            result = self.db.session.execute(
+                delete(ChangeLog)
+                .where(ChangeLog.seq < newest)
+                .where(or_(ChangeLog.changed_at < utcnow() - max_age,
+                           ChangeLog.seq <= newest - max_rows))
+            )
+            self.db.session.commit()
+            logging.info(f"Compacted the change log, deleted {result.rowcount} entries.")
+            return result.rowcount
+
+        except SQLAlchemyError as e:
+            self.db.session.rollback()
+            logging.error(f"Error compacting the change log: {e}")
+            raise ValueError("Could not compact the change log.")
+
+    def find_movie(self, title=None, release_year=None, imdb_id=None):
+        """
+        Look a movie up in the local catalogue, without asking OMDb.
+        Args:
+            title (str, optional): The exact title of the movie.
+            release_year (int, optional): The release year, to tell remakes apart.
+            imdb_id (str, optional): The IMDb ID; preferred over the title when given.
+        Returns:
+            Movie: The movie if it is stored, None otherwise.
+        """
+        if imdb_id:
+            return self.get_movie_by_imdb_id(imdb_id)
+        if not title:
+            return None
+        query = self.db.session.query(Movie).filter(Movie.title == title)
+        if release_year is not None:
+            query = query.filter(Movie.release_year == release_year)
+        # Prefer rows that carry an IMDb ID over legacy ones
+        return query.order_by(Movie.imdb_id.is_(None), Movie.id).first()
+
+    def iter_collection(self, user_id=None, page_size=500):
+        """
+        Yield a user's collection, or the whole catalogue, in constant memory.
+
+        Rows are read in pages by movie ID. The read transaction ends after
+        each page, so a slow download never holds up writers.
+        Args:
+            user_id (int, optional): The user whose collection is read. Defaults to all movies.
+            page_size (int, optional): Rows read per query.
+        Yields:
+            dict: One movie per row. A user's rows carry their own `rating`; catalogue
+                  rows carry the users' `average_rating` and `rating_count`.
+        """
+        columns = [Movie.id, Movie.imdb_id, Movie.title, Movie.release_year, Movie.director,
+                   Movie.rating.label('imdb_rating')]
+        if user_id is None:
+            query = select(*columns, Movie.rating_count, Movie.rating_sum)
+        else:
+            query = (select(*columns, UserMovies.rating)
+                     .join(UserMovies, UserMovies.movie_id == Movie.id)
+                     .where(UserMovies.user_id == user_id))
+
+        last_id = 0
+        while True:
+            rows = self.db.session.execute(
+                query.where(Movie.id > last_id).order_by(Movie.id).limit(page_size)
+            ).mappings().all()
+            self.db.session.commit()
+            if not rows:
+                return
+            for row in rows:
+                row = dict(row)
+                if user_id is None:
+                    total = row.pop('rating_sum')
+                    row['average_rating'] = (round(total / row['rating_count'], 1)
+                                             if row['rating_count'] else None)
+                yield row
+            last_id = rows[-1]['id']
+
     def get_user_by_name(self, user_name):
         """
         Retrieve a user by their name.
@@ -0,0 +1,210 @@
+import cProfile
+import hmac
+import json
+import logging
+import os
+import random
+import threading
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timezone
+from flask import abort, g, jsonify, request, send_from_directory
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Header that asks for the current request to be profiled, carrying PROFILE_TOKEN
+PROFILE_HEADER = 'X-Profile-Token'
+
+# The profile being recorded on this thread, if any
+_active = threading.local()
+
+# tracemalloc is process-wide; it runs while at least one request is profiled
+_tracing_lock = threading.Lock()
+_tracing_requests = 0
+
+
+class RequestProfile:
+    """Everything recorded while profiling one request."""
+
+    def __init__(self):
+        self.id = f"{datetime.now(timezone.utc):%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+        self.profiler = cProfile.Profile()
+        self.statements = []
+        self.started = time.perf_counter()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    """Note when a statement starts, if this thread is being profiled."""
+    if getattr(_active, 'profile', None) is not None:
+        conn.info.setdefault('profile_query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    """Record a statement and its duration, if this thread is being profiled."""
+    profile = getattr(_active, 'profile', None)
+    if profile is not None and conn.info.get('profile_query_start'):
+        started = conn.info['profile_query_start'].pop()
+        profile.statements.append({
+            "statement": statement,
+            "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+        })
+
+
+def _start_tracing():
+    """Start tracing allocations, or share the trace of a request already profiled."""
+    global _tracing_requests
+    with _tracing_lock:
+        if _tracing_requests == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        _tracing_requests += 1
+        tracemalloc.reset_peak()
+
+
+def _stop_tracing():
+    """
+    Read the allocation peak and stop tracing when no profiled request is left.
+    Returns:
+        dict: Current and peak traced memory in bytes, and the largest allocation sites.
+    """
+    global _tracing_requests
+    with _tracing_lock:
+        current, peak = tracemalloc.get_traced_memory()
+        top = tracemalloc.take_snapshot().statistics('lineno')[:10]
+        _tracing_requests -= 1
+        if _tracing_requests == 0:
+            tracemalloc.stop()
+    return {
+        "current_bytes": current,
+        "peak_bytes": peak,
+        "top_allocations": [{"location": str(stat.traceback), "size_bytes": stat.size,
+                             "count": stat.count} for stat in top],
+    }
+
+
+def _prune(directory, keep):
+    """Delete all but the newest `keep` profiles."""
+    reports = sorted(name for name in os.listdir(directory) if name.endswith('.json'))
+    for name in reports[:-keep] if keep else reports:
+        for suffix in ('.json', '.prof'):
+            try:
+                os.remove(os.path.join(directory, name[:-len('.json')] + suffix))
+            except FileNotFoundError:
+                pass
+
+
+def init_profiling(app):
+    """
+    Profile selected requests and keep the results for download.
+
+    A request is profiled when it carries the PROFILE_TOKEN in the X-Profile-Token
+    header, or at random for a PROFILE_SAMPLE_RATE share of requests. Its cProfile
+    statistics, SQL statements with timings and allocation peak are written to
+    PROFILE_DIR, and the response carries the profile ID in X-Profile-Id.
+    Other requests only pay for the sampling decision.
+
+    Stored profiles are listed at /profiles and downloaded from
+    /profiles/<id>.json and /profiles/<id>.prof, with the same header.
+    Args:
+        app (Flask): The Flask application.
+    """
+    app.config.setdefault('PROFILE_TOKEN', None)
+    app.config.setdefault('PROFILE_SAMPLE_RATE', 0.0)
+    app.config.setdefault('PROFILE_DIR', os.path.join(app.instance_path, 'profiles'))
+    app.config.setdefault('PROFILE_KEEP', 100)
+
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+    def authorized():
+        """Tell whether the request carries the profiling token."""
+        token = app.config['PROFILE_TOKEN']
+        offered = request.headers.get(PROFILE_HEADER)
+        # compare_digest rejects non-ASCII strings, so compare the bytes as sent;
+        # WSGI decodes header bytes as latin-1
+        return bool(token and offered
+                    and hmac.compare_digest(offered.encode('latin-1'), token.encode()))
+
+    @app.before_request
+    def start_profile():
+        """Start profiling the request if it asked for it or was sampled."""
+        if request.endpoint in ('list_profiles', 'download_profile'):
+            return
+        sample_rate = app.config['PROFILE_SAMPLE_RATE']
+        if not (PROFILE_HEADER in request.headers and authorized()
+                or sample_rate and random.random() < sample_rate):
+            return
+
+        stale = getattr(_active, 'profile', None)
+        if stale is not None:
+            # The previous response on this thread was never closed
+            stale.profiler.disable()
+            _stop_tracing()
+            logging.warning(f"Discarding unfinished profile {stale.id}.")
+
+        profile = g.profile = _active.profile = RequestProfile()
+        _start_tracing()
+        profile.profiler.enable()
+
+    def finish_profile(profile, method, path, status):
+        """Stop profiling and write the results; runs once the response body has been sent."""
+        profile.profiler.disable()
+        _active.profile = None
+        duration = time.perf_counter() - profile.started
+        memory = _stop_tracing()
+
+        directory = app.config['PROFILE_DIR']
+        os.makedirs(directory, exist_ok=True)
+        profile.profiler.dump_stats(os.path.join(directory, f"{profile.id}.prof"))
+        report = {
+            "id": profile.id,
+            "method": method,
+            "path": path,
+            "status": status,
+            "duration_ms": round(duration * 1000, 3),
+            "sql_count": len(profile.statements),
+            "sql_ms": round(sum(s["duration_ms"] for s in profile.statements), 3),
+            "sql": profile.statements,
+            "memory": memory,
+        }
+        with open(os.path.join(directory, f"{profile.id}.json"), 'w') as handle:
+            json.dump(report, handle, indent=2)
+        _prune(directory, app.config['PROFILE_KEEP'])
+        logging.info(f"Profiled {method} {path} in {report['duration_ms']} ms as {profile.id}.")
+
+    @app.after_request
+    def attach_profile(response):
+        """Finish the profile when the response is closed, so streamed bodies are included."""
+        profile = g.pop('profile', None)
+        if profile is None:
+            return response
+        response.headers['X-Profile-Id'] = profile.id
+        method, path, status = request.method, request.full_path, response.status_code
+        response.call_on_close(lambda: finish_profile(profile, method, path, status))
+        return response
+
+    @app.teardown_request
+    def abandon_profile(error=None):
+        """Finish the profile of a request that failed before a response was made."""
+        profile = g.pop('profile', None)
+        if profile is not None:
+            finish_profile(profile, request.method, request.full_path, 500)
+
+    def list_profiles():
+        """List the stored profiles, newest first."""
+        if not authorized():
+            abort(404)
+        directory = app.config['PROFILE_DIR']
+        names = os.listdir(directory) if os.path.isdir(directory) else []
+        return jsonify(sorted((name[:-len('.json')] for name in names if name.endswith('.json')),
+                              reverse=True))
+
+    def download_profile(filename):
+        """Download a profile's report (.json) or pstats dump (.prof)."""
+        if not authorized() or not filename.endswith(('.json', '.prof')):
+            abort(404)
+        return send_from_directory(app.config['PROFILE_DIR'], filename, as_attachment=True)
+
+    app.add_url_rule('/profiles', 'list_profiles', list_profiles)
+    app.add_url_rule('/profiles/<path:filename>', 'download_profile', download_profile)
@@ -0,0 +1,207 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+
+class QuotaExceeded(Exception):
+    """Raised when an OMDb lookup is refused because the daily quota is nearly used up."""
+
+
+class SharedTokenBucket:
+    """
+    Token buckets whose state lives in a SQLite file shared by all worker processes.
+
+    Each bucket is one row holding its token level and when it was last updated.
+    Taking a token refills the bucket for the time passed and updates the row in
+    a single write transaction, so concurrent processes never spend the same token.
+    Counters for metrics are kept in the same file.
+    """
+
+    # Idle client buckets are pruned once every this many takes per process
+    PRUNE_EVERY = 256
+
+    def __init__(self, path):
+        """
+        Initialize the buckets. The file is created on first use.
+        Args:
+            path (str): The SQLite file holding the bucket state.
+        """
+        self.path = path
+        self._schema_ready = False
+        self._lock = threading.Lock()
+        self._takes = 0
+
+    def _connect(self):
+        """Open a connection in autocommit mode, so transactions are started explicitly."""
+        if self._schema_ready:
+            return sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        with self._lock:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            if not self._schema_ready:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("CREATE TABLE IF NOT EXISTS buckets "
+                             "(name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)")
+                conn.execute("CREATE TABLE IF NOT EXISTS counters "
+                             "(name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+                self._schema_ready = True
+            return conn
+
+    @staticmethod
+    def _refilled(conn, name, rate, capacity, now):
+        """Return the current token level of a bucket, a missing bucket being full."""
+        row = conn.execute("SELECT tokens, updated FROM buckets WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            return capacity
+        tokens, updated = row
+        return min(capacity, tokens + max(0.0, now - updated) * rate)
+
+    def take(self, name, rate, capacity, reserve=0):
+        """
+        Take one token from a bucket if more than `reserve` tokens would remain.
+        Args:
+            name (str): The bucket, e.g. 'omdb' or 'client:127.0.0.1'.
+            rate (float): Tokens added per second.
+            capacity (float): The maximum number of tokens.
+            reserve (float, optional): Tokens that must be left in the bucket.
+        Returns:
+            bool: True if a token was taken.
+        """
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            tokens = self._refilled(conn, name, rate, capacity, now)
+            taken = tokens - 1 >= reserve
+            if taken:
+                tokens -= 1
+            conn.execute("INSERT INTO buckets (name, tokens, updated) VALUES (?, ?, ?) "
+                         "ON CONFLICT(name) DO UPDATE SET tokens = excluded.tokens, "
+                         "updated = excluded.updated", (name, tokens, now))
+
+            self._takes += 1
+            if self._takes % self.PRUNE_EVERY == 0:
+                # Idle client buckets have refilled completely; a missing row means full
+                conn.execute("DELETE FROM buckets WHERE name LIKE 'client:%' AND updated < ?",
+                             (now - 24 * 60 * 60,))
+            conn.execute("COMMIT")
+            return taken
+        except sqlite3.Error:
+            # BEGIN itself may have failed, e.g. "database is locked"; keep that error
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def level(self, name, rate, capacity):
+        """
+        Return the number of tokens currently in a bucket.
+        Args:
+            name (str): The bucket.
+            rate (float): Tokens added per second.
+            capacity (float): The maximum number of tokens.
+        Returns:
+            float: The token level.
+        """
+        conn = self._connect()
+        try:
+            return self._refilled(conn, name, rate, capacity, time.time())
+        finally:
+            conn.close()
+
+    def increment(self, name, amount=1):
+        """Add `amount` to a counter."""
+        conn = self._connect()
+        try:
+            conn.execute("INSERT INTO counters (name, value) VALUES (?, ?) "
+                         "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                         (name, amount))
+        finally:
+            conn.close()
+
+    def counters(self):
+        """
+        Return all counters.
+        Returns:
+            dict: Counter values by name.
+        """
+        conn = self._connect()
+        try:
+            return dict(conn.execute("SELECT name, value FROM counters"))
+        finally:
+            conn.close()
+
+
+class QuotaGovernor:
+    """
+    Guard the OMDb API key's daily quota and limit how fast each client may add movies.
+
+    The quota is a token bucket holding one day's requests that refills evenly
+    over the day. When only the reserve is left, lookups are refused so they can
+    be answered from the cache only, instead of the key running dry for everyone.
+    """
+
+    def __init__(self, path, daily_quota=1000, reserve=50, client_rate=10, client_burst=10):
+        """
+        Initialize the governor.
+        Args:
+            path (str): The SQLite file shared by the worker processes.
+            daily_quota (int, optional): OMDb requests allowed per day.
+            reserve (int, optional): Requests kept back; below this only the cache is used.
+            client_rate (float, optional): Movies a client may add per minute.
+            client_burst (int, optional): Movies a client may add in a quick burst.
+        """
+        self.bucket = SharedTokenBucket(path)
+        self.daily_quota = daily_quota
+        self.reserve = reserve
+        self.refill_rate = daily_quota / (24 * 60 * 60)
+        self.client_rate = client_rate / 60
+        self.client_burst = client_burst
+
+    def acquire(self):
+        """
+        Take one OMDb request from the daily quota.
+        Returns:
+            bool: True if the request may be sent, False if only the cache may be used.
+        """
+        if self.bucket.take('omdb', self.refill_rate, self.daily_quota, reserve=self.reserve):
+            self.bucket.increment('omdb_requests')
+            return True
+        self.bucket.increment('omdb_refused')
+        logging.warning("OMDb quota nearly used up, answering lookups from the cache only.")
+        return False
+
+    def allow_client(self, client):
+        """
+        Take one add from a client's allowance.
+        Args:
+            client (str): Identifies the client, e.g. its IP address.
+        Returns:
+            bool: True if the client may add a movie now.
+        """
+        if self.bucket.take(f'client:{client}', self.client_rate, self.client_burst):
+            return True
+        self.bucket.increment('clients_limited')
+        logging.warning(f"Client {client} exceeded the add-movie limit.")
+        return False
+
+    def stats(self):
+        """
+        Report the remaining budget and usage counters.
+        Returns:
+            dict: The quota metrics.
+        """
+        remaining = self.bucket.level('omdb', self.refill_rate, self.daily_quota)
+        counters = self.bucket.counters()
+        return {
+            "daily_quota": self.daily_quota,
+            "remaining": int(remaining),
+            "reserve": self.reserve,
+            "cache_only": remaining - 1 < self.reserve,
+            "requests": counters.get('omdb_requests', 0),
+            "refused": counters.get('omdb_refused', 0),
+            "clients_limited": counters.get('clients_limited', 0),
+        }
@@ -0,0 +1,269 @@
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from sqlalchemy import func, select, tuple_, update
+from datamanager.data_models import Movie, utcnow
+from api_helper import fetch_movie_data
+
+
+class TokenBucket:
+    """
+    A thread-safe token bucket used to cap the rate of OMDb requests.
+
+    Tokens are added continuously at `rate` per second up to `capacity`. Each call
+    to `acquire` takes one token, sleeping until one is available.
+    """
+
+    def __init__(self, rate, capacity=None):
+        """
+        Initialize the bucket full.
+        Args:
+            rate (float): Tokens added per second.
+            capacity (int, optional): Maximum burst size. Defaults to `rate`, at least 1.
+        """
+        self.rate = float(rate)
+        self.capacity = float(capacity or max(1, rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available and take it."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def _parse_text(value):
+    """Return an OMDb text field, or None when it is missing or 'N/A'."""
+    if not value or value == 'N/A':
+        return None
+    return value
+
+
+class MovieRefresher:
+    """
+    Re-fetch stale movie metadata from OMDb and store it in batches.
+
+    Movies are scanned stalest first using a keyset cursor on
+    (`refreshed_at`, `id`). Only movies with an IMDb ID are refreshed: a title
+    search could match a same-title remake and overwrite the stored details, so
+    older rows wait until `backfill_imdb_ids` has matched them. The cursor is written to a checkpoint file after each
+    committed batch, so an interrupted pass resumes where it stopped instead of
+    scanning the table again.
+    """
+
+    def __init__(self, db, checkpoint_path, max_age=timedelta(days=7), rate=1.0,
+                 concurrency=4, batch_size=50):
+        """
+        Initialize the refresher.
+        Args:
+            db (SQLAlchemy): The Flask-SQLAlchemy extension bound to the app.
+            checkpoint_path (str): File used to persist the scan cursor.
+            max_age (timedelta, optional): Movies refreshed more recently are skipped.
+            rate (float, optional): Maximum OMDb requests per second.
+            concurrency (int, optional): Maximum number of requests in flight.
+            batch_size (int, optional): Number of movies fetched and updated per batch.
+        """
+        self.db = db
+        self.checkpoint_path = checkpoint_path
+        self.max_age = max_age
+        self.bucket = TokenBucket(rate)
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+
+    def _load_checkpoint(self):
+        """
+        Load the cursor of an interrupted pass.
+        Returns:
+            dict: The checkpoint, or None if there is no pass to resume.
+        """
+        try:
+            with open(self.checkpoint_path) as handle:
+                checkpoint = json.load(handle)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable refresh checkpoint: {e}")
+            return None
+
+        return {
+            "cutoff": datetime.fromisoformat(checkpoint["cutoff"]),
+            "refreshed_at": datetime.fromisoformat(checkpoint["refreshed_at"]),
+            "id": checkpoint["id"],
+        }
+
+    def _save_checkpoint(self, cutoff, refreshed_at, movie_id):
+        """Atomically persist the cursor after a committed batch."""
+        tmp_path = f"{self.checkpoint_path}.tmp"
+        with open(tmp_path, "w") as handle:
+            json.dump({
+                "cutoff": cutoff.isoformat(),
+                "refreshed_at": refreshed_at.isoformat(),
+                "id": movie_id,
+            }, handle)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def _clear_checkpoint(self):
+        """Remove the checkpoint once a pass has completed."""
+        try:
+            os.remove(self.checkpoint_path)
+        except FileNotFoundError:
+            pass
+
+    def _next_batch(self, cutoff, cursor):
+        """
+        Select the next batch of stale movies with an IMDb ID after the cursor.
+        Args:
+            cutoff (datetime): Movies refreshed before this are stale.
+            cursor (tuple): The (refreshed_at, id) of the last processed movie, or None.
+        Returns:
+            list: Rows of (id, imdb_id, title, release_year, refreshed_at).
+        """
+        query = (
+            select(Movie.id, Movie.imdb_id, Movie.title, Movie.release_year, Movie.refreshed_at)
+            .where(Movie.refreshed_at < cutoff)
+            .where(Movie.imdb_id.isnot(None))
+            .order_by(Movie.refreshed_at, Movie.id)
+            .limit(self.batch_size)
+        )
+        if cursor:
+            query = query.where(tuple_(Movie.refreshed_at, Movie.id) > cursor)
+        return self.db.session.execute(query).all()
+
+    def _fetch(self, row):
+        """
+        Fetch fresh metadata for one movie, honouring the rate limit.
+        Args:
+            row: A row of (id, imdb_id, title, release_year, refreshed_at).
+        Returns:
+            dict: Values for the bulk update, or None if OMDb returned nothing usable.
+        """
+        self.bucket.acquire()
+        movie_data = fetch_movie_data(row.title, imdb_id=row.imdb_id, year=row.release_year,
+                                      use_cache=False)
+        if not movie_data:
+            return None
+
+        values = {"id": row.id, "refreshed_at": utcnow()}
+        rating = movie_data['rating']
+        if rating is not None:
+            values["rating"] = rating
+        for key in ("director", "poster"):
+            value = _parse_text(movie_data[key])
+            if value is not None:
+                values[key] = value
+        return values
+
+    def _apply(self, updates):
+        """
+        Write a batch of refreshed values in one transaction.
+
+        Rows are grouped by the set of columns they change, since a bulk UPDATE
+        by primary key needs the same keys in every parameter set.
+        Args:
+            updates (list[dict]): Values keyed by column name, each including `id`.
+        """
+        groups = {}
+        for values in updates:
+            groups.setdefault(frozenset(values), []).append(values)
+
+        try:
+            for rows in groups.values():
+                self.db.session.execute(update(Movie), rows)
+            self.db.session.commit()
+        except Exception:
+            self.db.session.rollback()
+            raise
+
+    def run_once(self, limit=None):
+        """
+        Run (or resume) one refresh pass over the stale movies.
+        Args:
+            limit (int, optional): Stop after this many movies have been processed.
+        Returns:
+            int: The number of movies that were updated.
+        """
+        checkpoint = self._load_checkpoint()
+        if checkpoint:
+            cutoff = checkpoint["cutoff"]
+            cursor = (checkpoint["refreshed_at"], checkpoint["id"])
+            logging.info(f"Resuming refresh pass after movie {checkpoint['id']}.")
+        else:
+            cutoff = utcnow() - self.max_age
+            cursor = None
+            unmatched = self.db.session.scalar(
+                select(func.count()).select_from(Movie).where(Movie.imdb_id.is_(None)))
+            if unmatched:
+                logging.warning(f"Skipping {unmatched} movies without an IMDb ID; "
+                                f"run backfill-imdb-ids to match them first.")
+
+        processed = updated = 0
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            while limit is None or processed < limit:
+                rows = self._next_batch(cutoff, cursor)
+                if limit is not None:
+                    rows = rows[:limit - processed]
+                if not rows:
+                    self._clear_checkpoint()
+                    logging.info("Refresh pass complete.")
+                    break
+
+                updates = [values for values in executor.map(self._fetch, rows) if values]
+                if updates:
+                    self._apply(updates)
+
+                last = rows[-1]
+                cursor = (last.refreshed_at, last.id)
+                self._save_checkpoint(cutoff, last.refreshed_at, last.id)
+
+                processed += len(rows)
+                updated += len(updates)
+                logging.info(f"Refreshed {len(updates)} of {len(rows)} movies in batch "
+                             f"({updated} of {processed} so far).")
+
+        return updated
+
+
+def backfill_imdb_ids(data, rate=1.0):
+    """
+    Look up and store the IMDb ID of every movie that does not have one yet.
+
+    Movies are matched by title and release year. When the ID turns out to
+    belong to another stored movie, the duplicates are merged.
+    Args:
+        data (SQLiteDataManager): The data manager used to update the movies.
+        rate (float, optional): Maximum OMDb requests per second.
+    Returns:
+        tuple: The number of movies updated and the number that could not be matched.
+    """
+    bucket = TokenBucket(rate)
+    rows = data.db.session.execute(
+        select(Movie.id, Movie.title, Movie.release_year)
+        .where(Movie.imdb_id.is_(None))
+        .order_by(Movie.id)
+    ).all()
+
+    updated = unmatched = 0
+    for row in rows:
+        bucket.acquire()
+        movie_data = fetch_movie_data(row.title, year=row.release_year)
+        if not movie_data or not movie_data['imdb_id']:
+            logging.warning(f"No IMDb ID found for movie {row.id} '{row.title}'.")
+            unmatched += 1
+            continue
+        data.assign_imdb_id(row.id, movie_data['imdb_id'])
+        updated += 1
+
+    return updated, unmatched
@@ -0,0 +1,98 @@
+import logging
+import os
+from sqlalchemy import text
+
+
+def default_workers():
+    """
+    Derive the worker count from the CPU cores this process may run on.
+
+    Uses gunicorn's recommended 2 x cores + 1, counting only the cores in the
+    process's affinity mask (e.g. a container's CPU set) where available.
+    Returns:
+        int: The number of worker processes.
+    """
+    if hasattr(os, 'sched_getaffinity'):
+        cores = len(os.sched_getaffinity(0))
+    else:
+        cores = os.cpu_count() or 1
+    return 2 * cores + 1
+
+
+def compile_templates(app):
+    """
+    Load every template so it is compiled before the first request.
+    Args:
+        app (Flask): The Flask application.
+    """
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+
+
+def warm_up(app):
+    """
+    Prepare a worker process so its first request is as fast as the rest.
+
+    Compiles the templates, opens a pooled database connection and renders the
+    home page once to prime Flask's and Jinja's internal caches. The schema was
+    already upgraded by the master process before it forked.
+    Args:
+        app (Flask): The Flask application.
+    """
+    compile_templates(app)
+    manager = app.extensions['data_manager']
+    with app.app_context():
+        manager.db.session.execute(text("SELECT 1"))
+        manager.db.session.remove()
+    app.test_client().get('/')
+    logging.info(f"Worker {os.getpid()} warmed up.")
+
+
+def run(app, bind, workers, graceful_timeout=30, timeout=30):
+    """
+    Serve the app with gunicorn's preforking multi-process server.
+
+    The app is loaded once in the master process, which upgrades the schema and
+    compiles the templates there, so forked workers share that memory and never
+    race each other on the upgrade. Each worker then opens its own database
+    connection. SIGTERM or SIGINT stops accepting connections and lets
+    in-flight requests finish within `graceful_timeout` seconds.
+    Args:
+        app (Flask): The Flask application.
+        bind (str): Address to listen on, e.g. '0.0.0.0:8000'.
+        workers (int): The number of worker processes.
+        graceful_timeout (int, optional): Seconds workers get to finish on shutdown.
+        timeout (int, optional): Seconds a silent worker is given before it is restarted.
+    Raises:
+        RuntimeError: If the app is in debug mode.
+    """
+    if app.debug:
+        raise RuntimeError("Refusing to start the production server in debug mode. "
+                           "Unset FLASK_DEBUG and do not pass --debug.")
+
+    # gunicorn is only needed (and only installable) on the production host
+    from gunicorn.app.base import BaseApplication
+
+    class MovieWebServer(BaseApplication):
+        """A gunicorn application serving an already created Flask app."""
+
+        def load_config(self):
+            options = {
+                'bind': bind,
+                'workers': workers,
+                'preload_app': True,
+                'graceful_timeout': graceful_timeout,
+                'timeout': timeout,
+                'post_worker_init': lambda worker: warm_up(app),
+            }
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            # Once, before forking; the children drop the connections used here
+            app.extensions['data_manager'].ensure_schema()
+            compile_templates(app)
+            return app
+
+    logging.info(f"Starting {workers} workers on {bind}.")
+    MovieWebServer().run()
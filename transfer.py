@@ -0,0 +1,201 @@
+import csv
+import io
+import json
+import logging
+import re
+
+# Export formats and their media types
+FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+# Columns of a user's collection, and of the whole catalogue
+USER_FIELDS = ['imdb_id', 'title', 'release_year', 'director', 'imdb_rating', 'rating']
+CATALOGUE_FIELDS = ['imdb_id', 'title', 'release_year', 'director', 'imdb_rating',
+                    'average_rating', 'rating_count']
+
+IMDB_ID_PATTERN = re.compile(r'^tt\d+$')
+
+
+def format_for(filename, default='csv'):
+    """
+    Guess the format of a collection file from its name.
+    Args:
+        filename (str): e.g. 'movies.csv' or 'movies.ndjson'.
+        default (str, optional): The format to assume for other names.
+    Returns:
+        str: 'csv' or 'ndjson'.
+    """
+    if filename and filename.lower().endswith(('.ndjson', '.jsonl')):
+        return 'ndjson'
+    if filename and filename.lower().endswith('.csv'):
+        return 'csv'
+    return default
+
+
+def export_rows(rows, fields, fmt):
+    """
+    Serialize rows one line at a time, so an export never holds the collection in memory.
+    Args:
+        rows (iterable[dict]): The rows to write, e.g. from `iter_collection`.
+        fields (list[str]): The columns to write, in order.
+        fmt (str): 'csv' or 'ndjson'.
+    Yields:
+        str: One line of output; for CSV the header comes first.
+    """
+    if fmt == 'ndjson':
+        for row in rows:
+            yield json.dumps({field: row.get(field) for field in fields}) + "\n"
+        return
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+
+    def line(values):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow(values)
+        return buffer.getvalue()
+
+    yield line(fields)
+    for row in rows:
+        yield line(['' if row.get(field) is None else row.get(field) for field in fields])
+
+
+def parse_rows(stream, fmt):
+    """
+    Read a collection file incrementally.
+    Args:
+        stream: A binary file object, e.g. an uploaded file or an open file.
+        fmt (str): 'csv' or 'ndjson'.
+    Yields:
+        tuple: The line number and the row as a dict, or None if the line is malformed.
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        for row in reader:
+            yield reader.line_num, {(key or '').strip().lower(): value for key, value in row.items()}
+        return
+
+    for line_number, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError:
+            row = None
+        yield line_number, row if isinstance(row, dict) else None
+
+
+def _clean_row(row):
+    """
+    Validate one imported row.
+    Args:
+        row (dict): The row as read from the file.
+    Returns:
+        tuple: The title, release year, IMDb ID and user's rating; missing values are None.
+    Raises:
+        ValueError: If the row has no title or IMDb ID, or holds an invalid value.
+    """
+    def value(name):
+        item = row.get(name)
+        item = item.strip() if isinstance(item, str) else item
+        return None if item in ('', None) else item
+
+    title = value('title')
+    title = str(title) if title is not None else None
+    imdb_id = value('imdb_id')
+    if imdb_id is not None and not IMDB_ID_PATTERN.match(str(imdb_id)):
+        raise ValueError(f"Invalid IMDb ID '{imdb_id}'.")
+    if not title and not imdb_id:
+        raise ValueError("A title or an IMDb ID is required.")
+
+    release_year = value('release_year')
+    release_year = int(release_year) if release_year is not None else None
+    rating = value('rating')
+    rating = float(rating) if rating is not None else None
+    if rating is not None and not (0 <= rating <= 10):
+        raise ValueError(f"Rating {rating} is not between 0 and 10.")
+    return title, release_year, imdb_id, rating
+
+
+def import_collection(data, user_id, rows, batch_size=100, progress=None, allow_lookup=None):
+    """
+    Add the movies of an imported file to a user's collection.
+
+    Each row is looked up in the local catalogue first, by IMDb ID or by title
+    and year, and only fetched from OMDb if it is not stored yet. Links and
+    ratings are written in batches of `batch_size` movies, one transaction per
+    batch. If OMDb's quota runs out, the movies resolved so far are still saved
+    before the error is raised.
+
+    Every OMDb lookup is first cleared with `allow_lookup`, e.g. the client's
+    add-movie allowance. When it is refused the import stops early: the movies
+    resolved so far are saved and `stopped_at` tells where to resume.
+    Args:
+        data (SQLiteDataManager): The data manager.
+        user_id (int): The user whose collection is extended.
+        rows (iterable): Line numbers and rows, as yielded by `parse_rows`.
+        batch_size (int, optional): Movies written per transaction.
+        progress (callable, optional): Called with the stats after each batch.
+        allow_lookup (callable, optional): Returns False to refuse an OMDb lookup.
+    Returns:
+        dict: Counts of rows read, movies added to the collection, movies found in
+              the catalogue or on OMDb, and rows that were not found or invalid,
+              and the line the import stopped at, or None if it read the whole file.
+    Raises:
+        QuotaExceeded: If OMDb's quota is nearly used up and a movie is not stored locally.
+    """
+    stats = {"rows": 0, "added": 0, "local": 0, "omdb": 0, "not_found": 0, "invalid": 0,
+             "stopped_at": None}
+    pending = {}
+
+    def flush():
+        if pending:
+            batch = dict(pending)
+            pending.clear()
+            stats["added"] += data.link_movies(user_id, batch)
+            if progress:
+                progress(dict(stats))
+
+    try:
+        for line_number, row in rows:
+            stats["rows"] += 1
+            try:
+                if row is None:
+                    raise ValueError("Malformed line.")
+                title, release_year, imdb_id, rating = _clean_row(row)
+            except (TypeError, ValueError) as e:
+                logging.warning(f"Skipping line {line_number} of the import for user {user_id}: {e}")
+                stats["invalid"] += 1
+                continue
+
+            movie = data.find_movie(title, release_year, imdb_id)
+            if movie:
+                stats["local"] += 1
+            elif allow_lookup and not allow_lookup():
+                logging.warning(f"Import for user {user_id} stopped at line {line_number}: "
+                                f"OMDb lookup refused.")
+                stats["rows"] -= 1
+                stats["stopped_at"] = line_number
+                break
+            else:
+                result = data.add_movie(user_id, title, release_year=release_year, imdb_id=imdb_id)
+                if result["status"] == "not_found":
+                    logging.warning(f"Movie '{title or imdb_id}' on line {line_number} not found.")
+                    stats["not_found"] += 1
+                    continue
+                movie = result["movie"]
+                stats["omdb"] += 1
+                if result["status"] != "linked":
+                    stats["added"] += 1
+
+            # A later row for the same movie only replaces the rating if it has one
+            if rating is not None or movie.id not in pending:
+                pending[movie.id] = rating
+            if len(pending) >= batch_size:
+                flush()
+    finally:
+        flush()
+
+    logging.info(f"Imported {stats['rows']} rows for user {user_id}: {stats}")
+    return stats